@@ -1,475 +1,3208 @@
-#!/usr/bin/env python3
-import os
-import subprocess
-import readline
-import random
-import time
-from datetime import datetime, timedelta
-import shutil
-import sys
-import pwd
-from faker import Faker
-import threading
-from enum import Enum
-
-class UserProfile(Enum): # (Enum) means that UserProfile inherits from the Enum base class, which is how Python knows this is an enumeration, not a regular class.
-    ADMIN = "admin"
-    DEVELOPER = "developer"
-    SYSADMIN = "sysadmin"
-    GENERAL = "general"
-    '''
-    - An enum is a symbolic name for a set of values. Enumerations are used when you have a fixed set of related constants that are conceptually grouped together. 
-    For example: roles, status codes, states, directions, etc.
-    '''
-
-class LinuxUserSimulator:
-    def __init__(self, num_commands=50, num_sudo=10, num_cronjobs=3, user=None, profile=UserProfile.GENERAL):
-        self.num_commands = num_commands
-        self.num_sudo = num_sudo
-        self.num_cronjobs = num_cronjobs
-        self.fake = Faker()
-        self.user = user or os.getenv('SUDO_USER', os.getenv('USER'))
-        self.profile = profile if isinstance(profile, UserProfile) else UserProfile(profile)
-        self.ensure_user_exists(self.user)
-        self.home_dir = pwd.getpwnam(self.user).pw_dir
-        self.bash_history = os.path.join(self.home_dir, '.bash_history')
-        self.bashrc = os.path.join(self.home_dir, '.bashrc')
-        self.auth_log = '/var/log/auth.log'
-        self.crontab = '/etc/crontab'
-        self.sudoers = '/etc/sudoers'
-        self.commands_executed = []
-        self.setup_directories()
-        
-        # Profile-specific adjustments
-        if self.profile == UserProfile.ADMIN:
-            self.num_sudo = max(self.num_sudo, int(self.num_commands * 0.4)) # It normalizes or boosts sudo usage numbers to match what’s expected for a user with elevated privileges like an ADMIN.
-            self.num_cronjobs = max(self.num_cronjobs, 5) # It ensures that the user has at least 5 cron jobs (self.num_cronjobs).
-        elif self.profile == UserProfile.DEVELOPER:
-            self.num_sudo = max(3, int(self.num_sudo * 0.5))
-        elif self.profile == UserProfile.SYSADMIN:
-            self.num_sudo = max(self.num_sudo, int(self.num_commands * 0.3))
-
-    def ensure_user_exists(self, username):
-        try:
-            pwd.getpwnam(username)
-        except KeyError:
-            print(f"User {username} not found - creating...")
-            try:
-                subprocess.run([
-                    'sudo', 'useradd',
-                    '-m',             # Create home directory
-                    '-s', '/bin/bash', # Set default shell
-                    username
-                ], check=True)
-                subprocess.run([
-                    'sudo', 'chpasswd',
-                ], input=f"{username}:password", encoding='ascii', check=True)
-                print(f"Created user {username} with home directory /home/{username}")
-            except subprocess.CalledProcessError as e:
-                print(f"Failed to create user: {e}")
-                sys.exit(1)
-
-    def setup_directories(self):
-        try:
-            # Backup original files if they exist
-            for f in [self.bash_history, self.bashrc]:
-                if os.path.exists(f):
-                    shutil.copy2(f, f + '.bak')
-        except Exception as e:
-            print(f"Warning: Could not backup files: {e}")
-
-    def generate_plausible_command(self, use_sudo=False):
-        # Base command sets, if the General user profile is selected.
-        base_commands = {
-            'file_ops': [
-                f"vim {self.fake.file_name(extension='txt')}",
-                f"nano {self.fake.file_name(extension='conf')}",
-                f"cat {self.fake.file_path(depth=3)}",
-                f"grep -r '{self.fake.word()}' {random.choice(['/etc', '/var/log', '/home'])}",
-                f"tail -n 20 {random.choice(['/var/log/syslog', '/var/log/auth.log'])}",
-                f"ls -la {random.choice(['~', '/tmp', '/etc'])}",
-                f"cp {self.fake.file_path(depth=2)} {self.fake.file_path(depth=1)}",
-                f"mv {self.fake.file_name()} {self.fake.file_name()}"
-            ],
-            'network': [
-                "curl -I https://example.com",
-                "wget https://example.com/file.zip",
-                "ping -c 4 8.8.8.8",
-                "netstat -tuln",
-                "ss -tuln",
-                "dig example.com",
-                "nslookup google.com"
-            ],
-            'system': [
-                "df -h",
-                "free -m",
-                "top -n 1 -b",
-                "ps aux",
-                "uname -a",
-                "lsb_release -a",
-                "systemctl status sshd",
-                "journalctl -xe"
-            ],
-            'package': [
-                "apt update",
-                "apt list --upgradable",
-                "dnf check-update",
-                "yum update",
-                "pip list --outdated",
-                "snap refresh --list"
-            ]
-        }
-        
-        # Profile-specific commands
-        profile_commands = {
-            UserProfile.ADMIN: {
-                'common': [
-                    "vim /etc/ssh/sshd_config",
-                    "nano /etc/nginx/nginx.conf",
-                    "cat /etc/passwd",
-                    "useradd " + self.fake.user_name(),
-                    "usermod -aG sudo " + self.fake.user_name(),
-                    "chown -R root:root /etc/"
-                ],
-                'sudo': [
-                    "systemctl restart nginx",
-                    "journalctl -u sshd -f",
-                    "ufw allow 22/tcp",
-                    "iptables -L -n -v",
-                    "visudo",
-                    "chmod 600 /etc/shadow"
-                ]
-            },
-            UserProfile.DEVELOPER: {
-                'common': [
-                    "git pull origin main",
-                    "git commit -am '" + self.fake.sentence() + "'",
-                    "git push origin main",
-                    "python3 setup.py install",
-                    "pip install -r requirements.txt",
-                    "docker build -t " + self.fake.word() + " .",
-                    "docker-compose up -d",
-                    "npm install " + self.fake.word(),
-                    "mvn clean install"
-                ],
-                'sudo': [
-                    "docker run -d -p 8080:80 nginx",
-                    "systemctl restart docker",
-                    "apt install -y " + random.choice(['python3-pip', 'nodejs', 'golang', 'openjdk-11-jdk'])
-                ]
-            },
-            UserProfile.SYSADMIN: {
-                'common': [
-                    "ss -tuln",
-                    "netstat -plant",
-                    "df -h",
-                    "free -m",
-                    "uptime",
-                    "who",
-                    "last",
-                    "cat /var/log/syslog | grep -i error",
-                    "tail -f /var/log/nginx/access.log",
-                    "du -sh /var/*"
-                ],
-                'sudo': [
-                    "systemctl restart " + random.choice(['nginx', 'apache2', 'mysql', 'postgresql']),
-                    "apt-get update && apt-get upgrade -y",
-                    "ufw status verbose",
-                    "smartctl -a /dev/sda",
-                    "zpool status",
-                    "virsh list --all"
-                ]
-            }
-        }
-
-        if use_sudo:
-            if self.profile in profile_commands:
-                sudo_commands = profile_commands[self.profile].get('sudo', [])
-            else:
-                sudo_commands = [
-                    "apt install -y " + self.fake.word(),
-                    "systemctl restart " + random.choice(['nginx', 'apache2', 'ssh', 'postgresql']),
-                    "useradd " + self.fake.user_name(),
-                    "usermod -aG " + random.choice(['sudo', 'docker', 'adm']) + " " + self.fake.user_name(),
-                    "chown -R " + self.fake.user_name() + ":" + self.fake.user_name() + " " + self.fake.file_path(depth=1),
-                    "chmod 755 " + self.fake.file_path(depth=2),
-                    "visudo"
-                ]
-            return "sudo " + random.choice(sudo_commands)
-        
-        if self.profile in profile_commands:
-            profile_specific = profile_commands[self.profile].get('common', [])
-            if profile_specific and random.random() > 0.6:
-                return random.choice(profile_specific)
-        
-        category = random.choice(list(base_commands.keys())) # If GENERAL was selected
-        return random.choice(base_commands[category])
-
-    def run_command(self, command):
-        try:
-            if random.random() > 0.2:
-                if command.startswith('sudo'):
-                    self.log_sudo_command(command)
-                else:
-                    try:
-                        subprocess.run(command, shell=True, check=False, 
-                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    except:
-                        pass
-            
-            self.commands_executed.append(command)
-            return True
-        except Exception as e:
-            print(f"Error executing command: {e}")
-            return False
-
-    def log_sudo_command(self, command):
-        sudo_log_entry = (
-            f"{datetime.now().strftime('%b %d %H:%M:%S')} {os.uname().nodename} "
-            f"sudo: {self.user} : TTY=pts/{random.randint(0,3)} ; "
-            f"PWD={self.fake.file_path(depth=3)} ; USER=root ; "
-            f"COMMAND={command[5:]}\n"
-        )
-        
-        try:
-            with open(self.auth_log, 'a') as f:
-                f.write(sudo_log_entry)
-        except PermissionError:
-            print(f"Warning: Could not write to {self.auth_log} (run with sudo?)")
-
-    def add_to_bash_history(self):
-        try:
-            with open(self.bash_history, 'a') as f:
-                for cmd in self.commands_executed:
-                    f.write(cmd + "\n")
-        except Exception as e:
-            print(f"Error writing to bash history: {e}")
-
-    def add_cron_jobs(self):
-        cron_jobs = []
-        
-        interpreters = [
-            "/usr/bin/python3",
-            "/usr/bin/python2",
-            "/usr/bin/perl",
-            "/usr/bin/bash",
-            "/usr/bin/ruby",
-            "/usr/bin/node",
-            "/bin/bash"
-        ]
-        
-        for _ in range(self.num_cronjobs):
-            minute = random.randint(0, 59)
-            hour = random.randint(0, 23)
-            day_of_month = random.randint(1, 31)
-            month = random.randint(1, 12)
-            day_of_week = random.randint(0, 6)
-
-            random_folder = self.fake.word()
-            random_file_name = self.fake.word()
-            file_extension = random.choice([".py", ".sh", ".bat", ".pl", ".php", ".js"])
-            
-            random_file_path = f"/home/{self.user}/{random_folder}/{random_file_name}{file_extension}"
-            
-            random_interpreter = random.choice(interpreters)
-            
-            cron_job = f"{minute} {hour} {day_of_month} {month} {day_of_week} {self.user} {random_interpreter} {random_file_path}\n"
-            cron_jobs.append(cron_job)
-        
-        try:
-            with open(self.crontab, 'a') as f:
-                f.write("\n# Added by user activity simulator\n")
-                for job in cron_jobs:
-                    f.write(job)
-        except PermissionError:
-            print(f"Warning: Could not write to {self.crontab} (run with sudo?)")
-
-    def modify_bashrc(self):
-        alias_commands = [
-            "ls -la", "cd ..", "git status", "top", "htop", "cat /etc/passwd",
-            "find / -name 'test*'", "echo 'hello world'", "df -h", "ps aux", "free -m"
-        ]
-        
-        path_additions = [
-            "/home/" + self.user + "/.local/bin",
-            "/usr/local/bin",
-            "/opt/bin"
-        ]
-        
-        ps1_formats = [
-            "PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\033[00m\\]\\$ '",
-            "PS1='\\[\\033[01;31m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;33m\\]\\w\\[\\033[00m\\]\\$ '",
-            "PS1='\\[\\033[01;36m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;35m\\]\\w\\[\\033[00m\\]\\$ '",
-            "PS1='\\[\\033[01;34m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;37m\\]\\w\\[\\033[00m\\]\\$ '"
-        ]
-        
-        random_alias_command = f"alias {self.fake.word()}='{random.choice(alias_commands)}'"
-        random_path = random.choice(path_additions)
-        random_ps1 = random.choice(ps1_formats)
-        
-        additions = [
-            "\n# Custom aliases added by simulation\n",
-            random_alias_command + "\n",
-            f"export PATH=$PATH:{random_path}\n",
-            random_ps1 + "\n"
-        ]
-        
-        try:
-            with open(self.bashrc, 'a') as f:
-                f.writelines(additions)
-            print(f"[*] Customizations added to {self.bashrc}")
-        except Exception as e:
-            print(f"Error modifying .bashrc: {e}")
-
-    def create_temp_files(self):
-        for _ in range(random.randint(3, 25)):
-            filename = f"/tmp/{self.fake.file_name()}"
-            content = self.fake.text(max_nb_chars=200)
-            try:
-                with open(filename, 'w') as f:
-                    f.write(content)
-            except Exception as e:
-                print(f"Error creating temp file: {e}")
-
-    def simulate(self):
-        print(f"[*] Simulating {self.num_commands} commands for {self.profile.value} user {self.user}...")
-        
-        for _ in range(self.num_commands - self.num_sudo):
-            cmd = self.generate_plausible_command()
-            self.run_command(cmd)
-        
-        for _ in range(self.num_sudo):
-            cmd = self.generate_plausible_command(use_sudo=True)
-            self.run_command(cmd)
-        
-        self.add_to_bash_history()
-        self.add_cron_jobs()
-        self.modify_bashrc()
-        self.create_temp_files()
-        
-        print("[*] Simulation complete. Artifacts generated:")
-        print(f"     - {len(self.commands_executed)} commands added to {self.bash_history}")
-        print(f"     - {self.num_sudo} sudo commands logged to {self.auth_log}")
-        print(f"     - {self.num_cronjobs} cron jobs added to {self.crontab}")
-        print(f"     - Customizations added to {self.bashrc}")
-        print(f"     - Temporary files written to /tmp")
-
-def simulate_concurrent_users(users_config):
-    threads = [] # empty list threads is created to store all the threads that will be created in the function. This allows us to manage and wait for them to complete later.
-    
-    for config in users_config: # The function expects an argument users_config, which is presumably a list of configurations for different users.
-        t = threading.Thread(target=run_single_simulation, args=(config,))
-        threads.append(t)
-        t.start() # starts the thread, meaning the simulation for the user begins executing concurrently in a separate thread.
-        time.sleep(random.uniform(0.1, 1.5))
-        '''
-        After starting each thread, the function sleeps for a random duration between 0.1 and 1.5 seconds using random.uniform(0.1, 1.5). This simulates a delay 
-        between starting each user's simulation, making the user actions less predictable and simulating real-world scenarios where users may not all start at 
-        the exact same time.
-        To ensure the threads don’t start simultaneously, a random sleep time between 0.1 and 1.5 seconds is added after each thread is started. This simulates 
-        users starting at different times.
-        '''
-    
-    for t in threads:
-        t.join() # blocking call that makes the main program wait for the thread t to complete before continuing.
-        # Finally, the t.join() method is called on each thread, ensuring the main program waits for all threads to finish before it proceeds.
-
-def run_single_simulation(config):
-    try:
-        simulator = LinuxUserSimulator(
-            num_commands=config.get('num_commands', 50),
-            num_sudo=config.get('num_sudo', 10),
-            num_cronjobs=config.get('num_cronjobs', 3),
-            user=config.get('user'),
-            profile=config.get('profile', UserProfile.GENERAL)
-        )
-        simulator.simulate()
-    except Exception as e:
-        print(f"Error simulating user {config.get('user')}: {e}")
-
-def display_centered_ascii_art():
-    ascii_art = r"""
- _________  ___  ___     ___    ___ _________  ________  ________  ________  _______      
-|\___   ___\\  \|\  \   |\  \  /  /|\___   ___\\   __  \|\   __  \|\   ____\|\  ___ \     
-\|___ \  \_\ \  \\\  \  \ \  \/  / ||___ \  \_\ \  \|\  \ \  \|\  \ \  \___|\ \   __/|    
-     \ \  \ \ \  \\\  \  \ \    / /     \ \  \ \ \   _  _\ \   __  \ \  \    \ \  \_|/__  
-      \ \  \ \ \  \\\  \  /     \/       \ \  \ \ \  \\  \\ \  \ \  \ \  \____\ \  \_|\ \ 
-       \ \__\ \ \_______\/  /\   \        \ \__\ \ \__\\ _\\ \__\ \__\ \_______\ \_______\
-        \|__|  \|_______/__/ /\ __\        \|__|  \|__|\|__|\|__|\|__|\|_______|\|_______|
-                        |__|/ \|__|                                                       
-    """
-    terminal_width = shutil.get_terminal_size().columns
-    centered_art = [line.center(terminal_width) for line in ascii_art.split('\n')]
-    print('\n'.join(centered_art))
-
-def main():
-    display_centered_ascii_art()
-    print("[*] This script simulates user activity and generates forensic artifacts.\n")
-    print("--- --- --- ---\n")
-    
-    try:
-        while True:  # Keep asking until we get valid input
-            mode = input("==> Simulation mode (single/multi): ").lower() or "single"
-            
-            if mode == "single":
-                num_commands = int(input("==> Number of commands to simulate (default 50): ") or 50)
-                num_sudo = int(input("==> Number of sudo commands to simulate (default 10): ") or 10)
-                num_cronjobs = int(input("==> Number of cron jobs to add (default 3): ") or 3)
-                username = input(f"==> Username to simulate (default {os.getenv('SUDO_USER', os.getenv('USER'))}): ") or None
-                profile = input("==> User profile (admin/developer/sysadmin/general): ").lower() or "general"
-                
-                simulator = LinuxUserSimulator(
-                    num_commands=num_commands,
-                    num_sudo=num_sudo,
-                    num_cronjobs=num_cronjobs,
-                    user=username,
-                    profile=profile
-                )
-                
-                print("\n[*] Note: Some operations require sudo privileges. You may be prompted for your password.")
-                print("\n[*] Starting simulation...\n")
-                simulator.simulate()
-                break  # Exit the loop after successful simulation
-                
-            elif mode == "multi":
-                num_users = int(input("==> Number of users to simulate (default 3): ") or 3)
-                users_config = []
-                
-                for i in range(num_users):
-                    print(f"\nConfiguring user #{i+1}:")
-                    username = input(f"==> Username (leave blank for current): ") or None
-                    profile = input("==> Profile (admin/developer/sysadmin/general): ").lower() or "general"
-                    commands = int(input("==> Commands per user (default 30): ") or 30)
-                    sudo = int(input("==> Sudo commands (default 5): ") or 5)
-                    cronjobs = int(input("==> Cron jobs (default 1): ") or 1)
-                    
-                    users_config.append({
-                        'user': username,
-                        'profile': profile,
-                        'num_commands': commands,
-                        'num_sudo': sudo,
-                        'num_cronjobs': cronjobs
-                    })
-                
-                print("\n[*] Starting concurrent simulation...")
-                simulate_concurrent_users(users_config)
-                print("\n[*] All user simulations completed")
-                break  # Exit the loop after successful simulation
-                
-            else:
-                print("[!] Invalid mode. Please enter either 'single' or 'multi'.")
-                continue  # Ask again
-            
-    except KeyboardInterrupt:
-        print("\n[!] Simulation cancelled by user.")
-        sys.exit(1)
-    except Exception as e:
-        print(f"[!] Error: {e}")
-        sys.exit(1)
-
-if __name__ == "__main__":
-    if os.geteuid() == 0:
-        main()
-    else:
-        print("[!] Warning: Some features require root privileges. Consider running with sudo.")
-        main()
\ No newline at end of file
+#!/usr/bin/env python3
+import os
+import subprocess
+import random
+import time
+from datetime import date, datetime, timedelta
+import shutil
+import sys
+import pwd
+import argparse
+import threading
+import fcntl
+import atexit
+import math
+import re
+import signal
+import errno
+import json
+import hashlib
+import mmap
+import socket
+import struct
+import heapq
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from enum import Enum
+from string import Formatter
+from collections import deque
+
+class UserProfile(Enum): # (Enum) means that UserProfile inherits from the Enum base class, which is how Python knows this is an enumeration, not a regular class.
+    ADMIN = "admin"
+    DEVELOPER = "developer"
+    SYSADMIN = "sysadmin"
+    GENERAL = "general"
+    '''
+    - An enum is a symbolic name for a set of values. Enumerations are used when you have a fixed set of related constants that are conceptually grouped together. 
+    For example: roles, status codes, states, directions, etc.
+    '''
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+class _Timer:
+    __slots__ = ('stats', 'name', 'started')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        entry = self.stats.get(self.name)
+        if entry is None:
+            entry = self.stats[self.name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += time.perf_counter() - self.started
+        return False
+
+class Instrumentation:
+    # Low-overhead timers and counters for the hot paths. Every thread records into its own dicts (no locking on the
+    # hot path); snapshot() adds them up, and merge() folds in snapshots returned by pool worker processes.
+    # Disabled by default, in which case timer() hands back a shared no-op context manager.
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+        self._threads = [] # (timers, counters) of every thread that recorded something
+        self._merged = {'timers': {}, 'counters': {}}
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._threads = []
+            self._merged = {'timers': {}, 'counters': {}}
+        self.started = time.perf_counter()
+
+    def _stats(self):
+        local = self._local
+        try:
+            return local.timers, local.counters
+        except AttributeError:
+            local.timers, local.counters = {}, {}
+            with self._lock:
+                self._threads.append((local.timers, local.counters))
+            return local.timers, local.counters
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self._stats()[0], name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            counters = self._stats()[1]
+            counters[name] = counters.get(name, 0) + n
+
+    def snapshot(self):
+        timers, counters = {}, {}
+        with self._lock:
+            sources = [(self._merged['timers'], self._merged['counters'])] + list(self._threads)
+        for t, c in sources:
+            for name, (calls, seconds) in list(t.items()):
+                entry = timers.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+            for name, value in list(c.items()):
+                counters[name] = counters.get(name, 0) + value
+        return {'timers': timers, 'counters': counters}
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, (calls, seconds) in snapshot['timers'].items():
+                entry = self._merged['timers'].setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+            for name, value in snapshot['counters'].items():
+                self._merged['counters'][name] = self._merged['counters'].get(name, 0) + value
+
+    def report(self, fmt='table'):
+        data = self.snapshot()
+        wall = time.perf_counter() - self.started
+        if fmt == 'json':
+            return json.dumps({
+                'wall_seconds': round(wall, 6),
+                'timers': {k: {'calls': c, 'seconds': round(s, 6)} for k, (c, s) in sorted(data['timers'].items())},
+                'counters': dict(sorted(data['counters'].items()))
+            }, indent=2)
+        width = max([34] + [len(name) for name in list(data['timers']) + list(data['counters'])])
+        lines = [f"[*] Profile report ({wall:.2f}s wall; times are summed over all threads/processes)",
+                 f"     {'phase':<{width}} {'calls':>9} {'total s':>10} {'avg ms':>9} {'% wall':>7}"]
+        for name, (calls, seconds) in sorted(data['timers'].items(), key=lambda kv: -kv[1][1]):
+            lines.append(f"     {name:<{width}} {calls:>9} {seconds:>10.3f} {1000 * seconds / calls:>9.3f} "
+                         f"{100 * seconds / wall if wall else 0:>6.1f}%")
+        if data['counters']:
+            lines.append(f"     {'counter':<{width}} {'value':>9}")
+            for name, value in sorted(data['counters'].items()):
+                lines.append(f"     {name:<{width}} {value:>9}")
+        return '\n'.join(lines)
+
+instrumentation = Instrumentation()
+
+class SamplingProfiler:
+    # Statistical profiler for the main thread: SIGPROF fires every `interval` seconds of CPU time
+    # and the function on top of the stack gets a sample
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = {}
+
+    def _sample(self, signum, frame):
+        if frame is not None:
+            key = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def report(self, top=15):
+        total = sum(self.samples.values()) or 1
+        lines = [f"[*] Sampling profile ({total} samples, main thread)"]
+        for key, count in sorted(self.samples.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"     {100 * count / total:>5.1f}%  {key}")
+        return '\n'.join(lines)
+
+# Command catalogue written as templates. Placeholders are filled lazily, only for the template that gets picked:
+#   {word} {user_name} {sentence}        -> Faker values
+#   {file_name} / {file_name:txt}        -> Faker file name (optionally with a fixed extension)
+#   {file_path:3}                        -> Faker file path with the given depth
+#   {choice:a|b|c}                       -> one of the listed options
+BASE_COMMAND_TEMPLATES = { # Base command sets, if the General user profile is selected.
+    'file_ops': [
+        "vim {file_name:txt}",
+        "nano {file_name:conf}",
+        "cat {file_path:3}",
+        "grep -r '{word}' {choice:/etc|/var/log|/home}",
+        "tail -n 20 {choice:/var/log/syslog|/var/log/auth.log}",
+        "ls -la {choice:~|/tmp|/etc}",
+        "cp {file_path:2} {file_path:1}",
+        "mv {file_name} {file_name}"
+    ],
+    'network': [
+        "curl -I https://example.com",
+        "wget https://example.com/file.zip",
+        "ping -c 4 8.8.8.8",
+        "netstat -tuln",
+        "ss -tuln",
+        "dig example.com",
+        "nslookup google.com"
+    ],
+    'system': [
+        "df -h",
+        "free -m",
+        "top -n 1 -b",
+        "ps aux",
+        "uname -a",
+        "lsb_release -a",
+        "systemctl status sshd",
+        "journalctl -xe"
+    ],
+    'package': [
+        "apt update",
+        "apt list --upgradable",
+        "dnf check-update",
+        "yum update",
+        "pip list --outdated",
+        "snap refresh --list"
+    ]
+}
+
+GENERAL_SUDO_TEMPLATES = [
+    "apt install -y {word}",
+    "systemctl restart {choice:nginx|apache2|ssh|postgresql}",
+    "useradd {user_name}",
+    "usermod -aG {choice:sudo|docker|adm} {user_name}",
+    "chown -R {user_name}:{user_name} {file_path:1}",
+    "chmod 755 {file_path:2}",
+    "visudo"
+]
+
+PROFILE_COMMAND_TEMPLATES = { # Profile-specific commands
+    UserProfile.ADMIN: {
+        'common': [
+            "vim /etc/ssh/sshd_config",
+            "nano /etc/nginx/nginx.conf",
+            "cat /etc/passwd",
+            "useradd {user_name}",
+            "usermod -aG sudo {user_name}",
+            "chown -R root:root /etc/"
+        ],
+        'sudo': [
+            "systemctl restart nginx",
+            "journalctl -u sshd -f",
+            "ufw allow 22/tcp",
+            "iptables -L -n -v",
+            "visudo",
+            "chmod 600 /etc/shadow"
+        ]
+    },
+    UserProfile.DEVELOPER: {
+        'common': [
+            "git pull origin main",
+            "git commit -am '{sentence}'",
+            "git push origin main",
+            "python3 setup.py install",
+            "pip install -r requirements.txt",
+            "docker build -t {word} .",
+            "docker-compose up -d",
+            "npm install {word}",
+            "mvn clean install"
+        ],
+        'sudo': [
+            "docker run -d -p 8080:80 nginx",
+            "systemctl restart docker",
+            "apt install -y {choice:python3-pip|nodejs|golang|openjdk-11-jdk}"
+        ]
+    },
+    UserProfile.SYSADMIN: {
+        'common': [
+            "ss -tuln",
+            "netstat -plant",
+            "df -h",
+            "free -m",
+            "uptime",
+            "who",
+            "last",
+            "cat /var/log/syslog | grep -i error",
+            "tail -f /var/log/nginx/access.log",
+            "du -sh /var/*"
+        ],
+        'sudo': [
+            "systemctl restart {choice:nginx|apache2|mysql|postgresql}",
+            "apt-get update && apt-get upgrade -y",
+            "ufw status verbose",
+            "smartctl -a /dev/sda",
+            "zpool status",
+            "virsh list --all"
+        ]
+    }
+}
+
+def _placeholder_filler(name, spec):
+    # Turns one "{name:spec}" placeholder into a callable(fake, rng) -> str, resolved once at compile time
+    if name == 'word':
+        return lambda fake, rng: fake.word()
+    if name == 'user_name':
+        return lambda fake, rng: fake.user_name()
+    if name == 'sentence':
+        return lambda fake, rng: fake.sentence()
+    if name == 'file_name':
+        if spec:
+            return lambda fake, rng: fake.file_name(extension=spec)
+        return lambda fake, rng: fake.file_name()
+    if name == 'file_path':
+        depth = int(spec or 1)
+        return lambda fake, rng: fake.file_path(depth=depth)
+    if name == 'choice':
+        options = tuple(spec.split('|'))
+        return lambda fake, rng: rng.choice(options)
+    raise ValueError(f"Unknown command placeholder: {{{name}}}")
+
+class CommandTemplate:
+    __slots__ = ('source', 'constant', 'parts')
+
+    def __init__(self, source):
+        self.source = source
+        self.parts = [] # Alternating literal strings and filler callables
+        for literal, name, spec, _ in Formatter().parse(source):
+            if literal:
+                self.parts.append(literal)
+            if name is not None:
+                self.parts.append(_placeholder_filler(name, spec))
+        # Templates without placeholders are rendered once and reused as-is
+        self.constant = source if all(isinstance(p, str) for p in self.parts) else None
+
+    def render(self, fake, rng):
+        if self.constant is not None:
+            return self.constant
+        return ''.join(p if isinstance(p, str) else p(fake, rng) for p in self.parts)
+
+class CommandCatalogue:
+    _compiled = {} # profile -> CommandCatalogue, so each profile is compiled once per process
+    _lock = threading.Lock()
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.categories = [[CommandTemplate(c) for c in cmds] for cmds in BASE_COMMAND_TEMPLATES.values()]
+        profile_templates = PROFILE_COMMAND_TEMPLATES.get(profile)
+        if profile_templates:
+            self.common = [CommandTemplate(c) for c in profile_templates.get('common', [])]
+            self.sudo = [CommandTemplate(c) for c in profile_templates.get('sudo', [])]
+        else:
+            self.common = []
+            self.sudo = [CommandTemplate(c) for c in GENERAL_SUDO_TEMPLATES]
+
+    @classmethod
+    def for_profile(cls, profile):
+        catalogue = cls._compiled.get(profile)
+        if catalogue is None:
+            with cls._lock:
+                catalogue = cls._compiled.setdefault(profile, cls(profile))
+        return catalogue
+
+    def pick(self, use_sudo, rng):
+        if use_sudo:
+            return rng.choice(self.sudo)
+        if self.common and rng.random() > 0.6:
+            return rng.choice(self.common)
+        return rng.choice(rng.choice(self.categories)) # If GENERAL was selected
+
+# Extra commands only the session model uses, so sessions can navigate before listing/editing
+SESSION_EXTRA_TEMPLATES = [
+    "cd {choice:~|/etc|/var/log|/tmp|/opt|..}",
+    "ls",
+    "git status",
+    "git diff",
+    "git add ."
+]
+
+# (from, to, boost): after a command matching `from`, commands matching `to` become `boost` times likelier
+SESSION_AFFINITIES = [
+    (r'^cd\b', r'^ls\b', 12),
+    (r'^ls\b', r'^(cat|vim|nano|cd|cp|mv)\b', 3),
+    (r'^git pull\b', r'^git (status|diff)\b', 6),
+    (r'^git (status|diff)\b', r'^git add\b', 6),
+    (r'^git add\b', r'^git commit\b', 12),
+    (r'^git commit\b', r'^git push\b', 10),
+    (r'^(vim|nano)\b', r'^(cat|ls|git (status|diff))\b', 3),
+    (r'^apt update\b', r'^apt list\b', 8),
+    (r'^(pip|npm) install\b', r'^(python3|npm|mvn|docker)\b', 3),
+    (r'^docker build\b', r'^docker-compose up\b', 6),
+    (r'^(df|du|free)\b', r'^(df|du|free)\b', 3),
+    (r'^(cat|tail) .*/var/log', r'^(tail|grep|journalctl)\b', 3),
+    (r'^(ss|netstat)\b', r'^(ss|netstat|ping|dig|curl)\b', 3),
+]
+
+class SessionModel:
+    # First-order Markov chain over a profile's (non-sudo) command templates. Each row of the transition matrix is
+    # stored as a cumulative-probability array, so drawing the next command is one random number + a bisect.
+    def __init__(self, states, initial, transitions, profile=None):
+        self.profile = profile
+        self.states = list(states)
+        self.templates = [CommandTemplate(s) for s in self.states]
+        self.initial = self._cumulative(initial)
+        self.transitions = [self._cumulative(row) for row in transitions]
+        self._digest = None
+
+    @staticmethod
+    def _cumulative(weights):
+        total = float(sum(weights)) or 1.0
+        cumulative = array('d')
+        running = 0.0
+        for w in weights:
+            running += w / total
+            cumulative.append(running)
+        cumulative[-1] = 1.0 # Guard against float drift at the end of the row
+        return cumulative
+
+    _defaults = {}
+
+    @classmethod
+    def for_profile(cls, profile):
+        # Default model built from the catalogue: the old pick probabilities as the baseline, then workflow affinities
+        model = cls._defaults.get(profile)
+        if model is None:
+            model = cls._defaults.setdefault(profile, cls._build_default(profile))
+        return model
+
+    @classmethod
+    def _build_default(cls, profile):
+        weights = {}
+        common = PROFILE_COMMAND_TEMPLATES.get(profile, {}).get('common', [])
+        base_share = 0.6 if common else 1.0
+        for commands in BASE_COMMAND_TEMPLATES.values():
+            for c in commands:
+                weights[c] = weights.get(c, 0.0) + base_share / len(BASE_COMMAND_TEMPLATES) / len(commands)
+        for c in common:
+            weights[c] = weights.get(c, 0.0) + 0.4 / len(common)
+        for c in SESSION_EXTRA_TEMPLATES:
+            if profile == UserProfile.DEVELOPER or not c.startswith('git'):
+                weights.setdefault(c, 0.03)
+        states = list(weights)
+        rules = [(re.compile(a), re.compile(b), boost) for a, b, boost in SESSION_AFFINITIES]
+        transitions = []
+        for current in states:
+            row = []
+            for nxt in states:
+                w = weights[nxt] * (0.3 if nxt == current else 1.0) # People rarely repeat the exact same command
+                for a, b, boost in rules:
+                    if a.search(current) and b.search(nxt):
+                        w *= boost
+                row.append(w)
+            transitions.append(row)
+        return cls(states, [weights[s] for s in states], transitions, profile=profile)
+
+    @classmethod
+    def load(cls, path):
+        # Model file (JSON): {"profile": ..., "states": [templates], "initial": [weights], "transitions": [[weights]]}
+        with open(path) as f:
+            data = json.load(f)
+        states = data['states']
+        if len(data['initial']) != len(states) or any(len(row) != len(states) for row in data['transitions']):
+            raise ValueError(f"Session model {path}: initial/transitions don't match the {len(states)} states")
+        profile = UserProfile(data['profile']) if data.get('profile') else None
+        return cls(states, data['initial'], data['transitions'], profile=profile)
+
+    def save(self, path):
+        def weights(cumulative):
+            return [round(b - a, 9) for a, b in zip([0.0] + list(cumulative[:-1]), cumulative)]
+        with open(path, 'w') as f:
+            json.dump({
+                'profile': self.profile.value if self.profile else None,
+                'states': self.states,
+                'initial': weights(self.initial),
+                'transitions': [weights(row) for row in self.transitions]
+            }, f)
+
+    def digest(self):
+        # Identifies the whole chain (a retrained model with the same states gets a different digest)
+        if self._digest is None:
+            h = hashlib.sha256(json.dumps(self.states).encode())
+            for row in [self.initial] + self.transitions:
+                h.update(row.tobytes())
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def walk_states(self, rng=random):
+        # Endless stream of state indices following the chain
+        transitions = self.transitions
+        state = bisect_right(self.initial, rng.random())
+        while True:
+            yield state
+            state = bisect_right(transitions[state], rng.random())
+
+    def walk(self, rng=random):
+        templates = self.templates
+        return (templates[state] for state in self.walk_states(rng))
+
+def derive_seed(*parts):
+    # Stable 64-bit seed from any mix of values (unlike hash(), identical across processes and runs)
+    return int.from_bytes(hashlib.sha256('|'.join(map(str, parts)).encode()).digest()[:8], 'big')
+
+_seeded_faker = None # One Faker shared by all seeded pools; it is re-seeded before every batch
+_seeded_faker_lock = threading.Lock()
+
+class FakerValuePool:
+    # Drop-in replacement for the Faker calls the simulator makes (word, file_name, file_path, user_name, sentence, text).
+    # Values are pre-generated in batches and handed out in O(1); a background thread tops a pool up when it runs low.
+    # One instance can be shared by all simulators/threads, so only one Faker() is ever built.
+    # With a seed, batch N of each value kind is always drawn from seed (seed, kind, N): the values a pool hands out
+    # are then reproducible no matter which other pools or threads use Faker meanwhile.
+    def __init__(self, batch_size=512, low_water=64, max_bytes=8 * 1024 * 1024, faker=None, seed=None):
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_bytes = max_bytes # Rough cap on memory held by all pools together
+        self.seed = seed
+        self._faker = faker
+        self._pools = {} # key -> deque of ready values
+        self._item_size = {} # key -> average bytes per value, measured on the first batch
+        self._batches = {} # key -> batches generated so far (seeded pools)
+        self._refilling = set()
+        # Faker instances are not thread-safe
+        self._gen_lock = _seeded_faker_lock if seed is not None and faker is None else threading.Lock()
+        self._state_lock = threading.Lock()
+        self._fill_lock = threading.Lock() # One in-line refill of an empty pool at a time
+
+    @property
+    def faker(self):
+        global _seeded_faker
+        if self._faker is None:
+            with self._gen_lock:
+                if self._faker is None:
+                    from faker import Faker # Imported on first use: batch runs that never need Faker start faster
+                    if self.seed is None:
+                        self._faker = Faker()
+                    else:
+                        _seeded_faker = _seeded_faker or Faker()
+                        self._faker = _seeded_faker
+        return self._faker
+
+    def _generate(self, key, n):
+        fake = self.faker
+        kind, arg = key
+        instrumentation.count(f"faker.{kind}", n)
+        with instrumentation.timer('faker.generate'), self._gen_lock:
+            if self.seed is not None:
+                batch = self._batches.get(key, 0)
+                self._batches[key] = batch + 1
+                fake.seed_instance(derive_seed(self.seed, kind, arg, batch))
+            if kind == 'word':
+                return fake.words(nb=n)
+            if kind == 'sentence':
+                return fake.sentences(nb=n)
+            if kind == 'user_name':
+                return [fake.user_name() for _ in range(n)]
+            if kind == 'file_name':
+                if arg is None:
+                    return [fake.file_name() for _ in range(n)]
+                return [fake.file_name(extension=arg) for _ in range(n)]
+            if kind == 'file_path':
+                return [fake.file_path(depth=arg) for _ in range(n)]
+            if kind == 'text':
+                return [fake.text(max_nb_chars=arg) for _ in range(n)]
+        raise ValueError(f"Unknown value kind: {kind}")
+
+    def _capacity(self, key):
+        # Split the memory cap evenly between the value kinds in use
+        per_key = self.max_bytes // max(1, len(self._pools))
+        return max(self.low_water * 2, per_key // self._item_size.get(key, 64))
+
+    def _fill(self, key):
+        pool = self._pools[key]
+        if self.seed is not None:
+            missing = self.batch_size # Fixed batches, so batch N always holds the same values
+        else:
+            missing = min(self.batch_size, self._capacity(key) - len(pool))
+        if missing <= 0:
+            return
+        values = self._generate(key, missing)
+        if key not in self._item_size:
+            self._item_size[key] = max(1, sum(len(v) for v in values) // len(values) + 49) # 49 = str object overhead
+        pool.extend(values)
+
+    def _refill_in_background(self, key):
+        with self._state_lock:
+            if key in self._refilling:
+                return
+            self._refilling.add(key)
+
+        def refill():
+            try:
+                self._fill(key)
+            finally:
+                with self._state_lock:
+                    self._refilling.discard(key)
+
+        threading.Thread(target=refill, daemon=True).start()
+
+    def _take(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._state_lock:
+                pool = self._pools.setdefault(key, deque())
+        while True:
+            try:
+                value = pool.popleft()
+                break
+            except IndexError:
+                # Pool drained faster than the background refill could keep up. Threads that find it empty
+                # wait for one refill instead of each generating a batch of their own.
+                with self._fill_lock:
+                    if not pool:
+                        self._fill(key)
+        if len(pool) < self.low_water and self.seed is None:
+            self._refill_in_background(key) # Seeded pools refill in line only, to keep batch order fixed
+        return value
+
+    def word(self):
+        return self._take(('word', None))
+
+    def sentence(self):
+        return self._take(('sentence', None))
+
+    def user_name(self):
+        return self._take(('user_name', None))
+
+    def file_name(self, extension=None):
+        return self._take(('file_name', extension))
+
+    def file_path(self, depth=1):
+        return self._take(('file_path', depth))
+
+    def text(self, max_nb_chars=200):
+        return self._take(('text', max_nb_chars))
+
+_shared_value_pool = None
+_shared_value_pool_lock = threading.Lock()
+
+def shared_value_pool():
+    # Process-wide pool used by every simulator that isn't handed one explicitly
+    global _shared_value_pool
+    if _shared_value_pool is None:
+        with _shared_value_pool_lock:
+            if _shared_value_pool is None:
+                _shared_value_pool = FakerValuePool()
+    return _shared_value_pool
+
+class ArtifactWriter:
+    # Owns the one append handle to an artifact file (auth.log, crontab, .bash_history, ...).
+    # Writes are buffered and go out as one large append once the buffer is big enough or old enough;
+    # a thread lock serialises appends in-process and an fcntl lock does the same across processes.
+    # With an ArtifactManifest open, each flush also resolves the byte offset and line number of every entry
+    # in it and feeds the bytes into a running SHA-256 of the file.
+    failures = 0 # Writers that gave up on their file in this process (benchmarks treat any as a failed run)
+
+    def __init__(self, path, max_buffer=64 * 1024, flush_interval=1.0):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffered = 0
+        self._entries = [] # (offset of a write in the buffer, its manifest entries)
+        self._file = None
+        self._failed = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._manifest = _manifest
+        self._hash = None
+        self._lines = 0
+
+    def write(self, data, entries=None):
+        # entries: manifest records for the data, as (offset within data, length, meta) tuples
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            if entries and self._manifest is not None:
+                self._entries.append((self._buffered, entries))
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.max_buffer or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        if self._manifest is not None and self._hash is None:
+            self._file_id = self._manifest.file_id(self.path)
+            # The running hash covers the whole file, so it starts with whatever is already there
+            self._hash = hashlib.sha256()
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    self._hash.update(block)
+                    self._lines += block.count(b'\n')
+
+    def _index(self, data, offset):
+        # Manifest rows for the entries of one flushed block that starts at byte `offset` of the file
+        rows = []
+        append, count, file_id = rows.append, data.count, self._file_id
+        lines, previous = self._lines, 0
+        for base, entries in self._entries:
+            if entries[0][2][1] in ArtifactManifest.BINARY_KINDS: # Line numbers mean nothing in wtmp/btmp
+                for pos, length, (user, kind, command, timestamp) in entries:
+                    append((user, kind, command, timestamp, file_id, offset + base + pos, length, None))
+                continue
+            for pos, length, (user, kind, command, timestamp) in entries:
+                pos += base
+                lines += count(b'\n', previous, pos)
+                previous = pos
+                append((user, kind, command, timestamp, file_id, offset + pos, length, lines + 1))
+        self._lines = lines + count(b'\n', previous)
+        self._hash.update(data)
+        self._entries.clear()
+        self._manifest.add(rows)
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        if self._failed:
+            self._entries.clear()
+            return
+        try:
+            if self._file is None:
+                self._open()
+            with instrumentation.timer('writer.flush'):
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                try:
+                    offset = os.fstat(self._file.fileno()).st_size if self._manifest is not None else 0
+                    self._file.write(data)
+                    self._file.flush()
+                    if self._manifest is not None:
+                        self._index(data, offset)
+                finally:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            instrumentation.count(f"bytes:{self.path}", len(data))
+        except OSError as e:
+            self._failed = True # Warn once, then drop further writes like the old per-line open did
+            ArtifactWriter.failures += 1
+            print(f"Warning: Could not write to {self.path} ({e.strerror}, run with sudo?)")
+
+    def append_from(self, source, entries=None):
+        # Appends a whole file (e.g. a cached artifact) kernel-side with sendfile, after whatever is buffered
+        if self._manifest is not None:
+            # Indexing and hashing need the bytes anyway, so take the normal buffered path
+            with open(source, 'rb') as src:
+                self.write(src.read(), entries)
+            return
+        with self._lock:
+            self._flush_locked()
+            if self._failed:
+                return
+            try:
+                if self._file is None:
+                    self._open()
+                out_fd = self._file.fileno()
+                fcntl.flock(out_fd, fcntl.LOCK_EX)
+                try:
+                    with open(source, 'rb') as src:
+                        remaining = os.fstat(src.fileno()).st_size
+                        offset = 0
+                        try:
+                            while remaining > 0:
+                                sent = os.sendfile(out_fd, src.fileno(), offset, remaining)
+                                if sent == 0:
+                                    break
+                                offset += sent
+                                remaining -= sent
+                        except OSError as e:
+                            if e.errno not in (errno.EINVAL, errno.ENOSYS): # Kernels that refuse O_APPEND targets
+                                raise
+                            src.seek(offset)
+                            shutil.copyfileobj(src, self._file, 1 << 20)
+                            self._file.flush()
+                        instrumentation.count(f"bytes:{self.path}", os.fstat(src.fileno()).st_size)
+                finally:
+                    fcntl.flock(out_fd, fcntl.LOCK_UN)
+            except OSError as e:
+                self._failed = True
+                ArtifactWriter.failures += 1
+                print(f"Warning: Could not write to {self.path} ({e.strerror}, run with sudo?)")
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _record_stream(self):
+        if self._hash is not None:
+            self._manifest.stream(self.path, self._file.tell(), self._lines, self._hash.hexdigest())
+
+    def checkpoint(self):
+        # Flushes and records the file's current size and hash in the manifest
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._record_stream()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._record_stream()
+                self._file.close()
+                self._file = None
+
+class ArtifactCollector:
+    # Stand-in for ArtifactWriter inside pool workers: keeps the bytes (and their manifest entries) in memory
+    # so the parent process can write them
+    def __init__(self, path):
+        self.path = path
+        self._chunks = []
+        self._entries = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, data, entries=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            if entries:
+                self._entries.extend((self._size + pos, length, meta) for pos, length, meta in entries)
+            self._chunks.append(data)
+            self._size += len(data)
+
+    def append_from(self, source, entries=None):
+        with open(source, 'rb') as f:
+            self.write(f.read(), entries)
+
+    def drain(self):
+        # (data, entries) collected since the last drain, ready for ArtifactWriter.write
+        with self._lock:
+            data = b''.join(self._chunks)
+            entries = self._entries
+            self._chunks, self._entries, self._size = [], [], 0
+        return data, entries
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+_artifact_writers = {} # path -> ArtifactWriter, shared by every simulator in the process
+_artifact_writers_lock = threading.Lock()
+_collect_artifacts = False # Set in pool workers: artifacts are handed back to the parent instead of written
+_manifest = None # ArtifactManifest that writers opened from now on index into (see open_manifest)
+_record_entries = False # Whether simulators describe what they write (true in pool workers of a manifest run too)
+
+def get_artifact_writer(path):
+    key = os.path.abspath(path)
+    writer = _artifact_writers.get(key)
+    if writer is None:
+        with _artifact_writers_lock:
+            writer = _artifact_writers.get(key)
+            if writer is None:
+                writer = ArtifactCollector(key) if _collect_artifacts else ArtifactWriter(key)
+                _artifact_writers[key] = writer
+    return writer
+
+SHARED_ARTIFACTS = ('/var/log/auth.log', '/etc/crontab', '/var/log/wtmp', '/var/log/btmp') # Appended to by every user
+
+def shared_artifact_paths(root=None):
+    return [os.path.join(root, p.lstrip('/')) if root else p for p in SHARED_ARTIFACTS]
+
+def release_artifact_writer(path):
+    # Closes and forgets the writer of a file only one simulator appends to (.bash_history, .bashrc), so a run over
+    # thousands of users doesn't hold a descriptor per home until the end. Pool collectors are kept: their bytes
+    # still have to go back to the parent.
+    if _collect_artifacts:
+        return
+    with _artifact_writers_lock:
+        writer = _artifact_writers.pop(os.path.abspath(path), None)
+    if writer is not None:
+        writer.close()
+
+def flush_artifact_writers():
+    for writer in list(_artifact_writers.values()):
+        writer.flush()
+
+def close_artifact_writers():
+    with _artifact_writers_lock:
+        writers = list(_artifact_writers.values())
+        _artifact_writers.clear()
+    for writer in writers:
+        writer.close()
+
+_MONTHS = {datetime(2000, m, 1).strftime('%b').encode(): m for m in range(1, 13)} # Same locale as the sudo lines
+
+def shared_artifact_sizes(roots):
+    # Sizes of the shared files of every root right now: where the output of a run that starts now will begin
+    sizes = {}
+    for root in roots:
+        for path in shared_artifact_paths(root):
+            path = os.path.abspath(path)
+            sizes[path] = os.path.getsize(path) if os.path.exists(path) else 0
+    return sizes
+
+def _utmp_pieces(data):
+    # (sort key, offset, length) of every record in a wtmp/btmp region, keyed by ut_tv and then the record itself,
+    # so records with the same time come out the same whichever user appended first
+    size = UTMP_STRUCT.size
+    return [(UTMP_STRUCT.unpack_from(data, pos)[9:11] + (data[pos:pos + size],), pos, size)
+            for pos in range(0, len(data) - size + 1, size)]
+
+def _syslog_pieces(data):
+    # (sort key, offset, length) of every line in an auth.log region, keyed by the stamp and then the line itself.
+    # Syslog stamps have no year, so when the region runs from December into January the first half of the year
+    # sorts after December.
+    pieces, pos, key = [], 0, (0, b'', b'')
+    for line in data.splitlines(keepends=True):
+        month = _MONTHS.get(line[:3])
+        if month:
+            key = (month, line[4:15], line) # "31 18:00:00"; lines that don't parse stay behind the one before them
+        pieces.append((key, pos, len(line)))
+        pos += len(line)
+    months = {key[0] for key, _, _ in pieces}
+    if 1 in months and 12 in months:
+        pieces = [((key[0] + 12 if key[0] <= 6 else key[0],) + key[1:], pos, length) for key, pos, length in pieces]
+    return pieces
+
+def merge_shared_artifacts(starts):
+    # Puts what a multi-user run appended to wtmp, btmp and auth.log (starts: path -> size before the run) into
+    # time order. Every user appends its records as one block, so without this the files jump back in time at
+    # each user boundary. Records from before the run are left where they are; manifest rows pointing into the
+    # merged region are moved along. Runs after all writers are closed, with the region read into memory.
+    for path, start in starts.items():
+        if path.endswith(('/wtmp', '/btmp')):
+            split, text = _utmp_pieces, False
+        elif path.endswith('/auth.log'):
+            split, text = _syslog_pieces, True
+        else:
+            continue
+        if not os.path.exists(path) or os.path.getsize(path) <= start:
+            continue
+        try:
+            with open(path, 'r+b') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(start)
+                    data = f.read()
+                    pieces = split(data)
+                    ordered = sorted(pieces, key=lambda piece: piece[0]) # Stable: same-second records keep their order
+                    if ordered == pieces:
+                        continue
+                    f.seek(start)
+                    f.write(b''.join(data[pos:pos + length] for _, pos, length in ordered))
+                    f.flush()
+                    if _manifest is not None:
+                        _relocate_manifest_rows(f, path, start, ordered, text)
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        except OSError as e:
+            print(f"Warning: Could not put {path} in time order ({e.strerror})")
+
+def _relocate_manifest_rows(f, path, start, ordered, text):
+    # Moves the manifest rows of a region merge_shared_artifacts reordered, then rehashes the file
+    # (same bytes and lines in a different order: only the hash changes)
+    lines = 0
+    f.seek(0)
+    while text and f.tell() < start:
+        lines += f.read(min(1 << 20, start - f.tell())).count(b'\n')
+    moves, offset = [], start
+    for index, (_, pos, length) in enumerate(ordered):
+        moves.append((start + pos, offset, lines + index + 1 if text else None))
+        offset += length
+    _manifest.relocate(path, moves)
+    digest, lines = hashlib.sha256(), 0
+    f.seek(0)
+    for block in iter(lambda: f.read(1 << 20), b''):
+        digest.update(block)
+        lines += block.count(b'\n')
+    _manifest.stream(path, offset, lines, digest.hexdigest())
+
+atexit.register(close_artifact_writers) # Last-resort flush if a run exits without closing its writers
+
+class ArtifactManifest:
+    # Ground-truth index of everything the simulator wrote, in SQLite: one row per command, sudo line, cron job,
+    # login record, ... with its user, time, file, byte offset, length and line number (NULL in binary files),
+    # plus the size, line count and SHA-256 of every written file. Rows are inserted in large batches and the
+    # indexes are built once at close, so queries like "sudo commands by alice in May" are index lookups.
+    BINARY_KINDS = ('login', 'logout', 'failed_login')
+
+    def __init__(self, path, batch_size=20000):
+        import sqlite3 # Only runs with a manifest need it
+        self.path = path
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, bytes INTEGER, lines INTEGER, sha256 TEXT);
+            CREATE TABLE IF NOT EXISTS artifacts (
+                user TEXT, kind TEXT, command TEXT, timestamp REAL,
+                file INTEGER REFERENCES files(id), offset INTEGER, length INTEGER, line INTEGER);
+            CREATE VIEW IF NOT EXISTS entries AS
+                SELECT user, kind, command, timestamp, path AS file, offset, length, line
+                FROM artifacts JOIN files ON files.id = artifacts.file;
+        """)
+        self._file_ids = dict(self.db.execute("SELECT path, id FROM files"))
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def _file_id(self, path):
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = self._file_ids[path] = self.db.execute(
+                "INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+        return file_id
+
+    def file_id(self, path):
+        with self._lock:
+            return self._file_id(path)
+
+    def add(self, rows):
+        # rows: (user, kind, command, timestamp, file id, offset, length, line)
+        with self._lock:
+            self._rows.extend(rows)
+            if len(self._rows) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._rows:
+            # One transaction per batch (the connection is in autocommit mode)
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._rows)
+            self.db.execute("COMMIT")
+            self._rows = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def stream(self, path, size, lines, sha256):
+        with self._lock:
+            self.db.execute("UPDATE files SET bytes = ?, lines = ?, sha256 = ? WHERE id = ?",
+                            (size, lines, sha256, self._file_id(path)))
+
+    def discard_after(self, offsets):
+        # Drops rows for bytes that were cut off a file (see CheckpointJournal), so a resumed run stays consistent
+        with self._lock:
+            self._flush_locked()
+            for path, size in offsets.items():
+                file_id = self._file_id(path)
+                self.db.execute("DELETE FROM artifacts WHERE file = ? AND offset >= ?", (file_id, size))
+                self.db.execute("UPDATE files SET bytes = NULL, lines = NULL, sha256 = NULL WHERE id = ?", (file_id,))
+
+    def relocate(self, path, moves):
+        # Points the rows of entries that were moved inside a file (see merge_shared_artifacts) at their new place.
+        # moves: (old offset, new offset, new line number)
+        with self._lock:
+            self._flush_locked()
+            file_id = self._file_id(path)
+            self.db.execute("BEGIN")
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS moves (old INTEGER PRIMARY KEY, new INTEGER, line INTEGER)")
+            self.db.execute("DELETE FROM moves")
+            self.db.executemany("INSERT INTO moves VALUES (?, ?, ?)", moves)
+            self.db.execute("UPDATE artifacts SET offset = (SELECT new FROM moves WHERE old = artifacts.offset), "
+                            "line = (SELECT line FROM moves WHERE old = artifacts.offset) "
+                            "WHERE file = ? AND offset IN (SELECT old FROM moves)", (file_id,))
+            self.db.execute("COMMIT")
+
+    def query(self, user=None, kind=None, start=None, end=None, file=None):
+        # Rows matching every given filter, in time order. start/end are epoch seconds (inclusive).
+        conditions, params = [], []
+        for column, op, value in (('user', '=', user), ('kind', '=', kind), ('timestamp', '>=', start),
+                                  ('timestamp', '<=', end), ('path', '=', file)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        with self._lock:
+            self._flush_locked()
+            return self.db.execute(
+                "SELECT user, kind, command, timestamp, path, offset, length, line "
+                "FROM artifacts JOIN files ON files.id = artifacts.file" +
+                (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY timestamp", params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self.db.executescript("""
+                CREATE INDEX IF NOT EXISTS artifacts_user_kind_time ON artifacts (user, kind, timestamp);
+                CREATE INDEX IF NOT EXISTS artifacts_kind_time ON artifacts (kind, timestamp);
+                CREATE INDEX IF NOT EXISTS artifacts_time ON artifacts (timestamp);
+            """)
+            self.db.close()
+
+def open_manifest(path, fresh=True):
+    # Writers created after this index into the manifest. fresh=False keeps the rows of an earlier run (--resume).
+    global _manifest, _record_entries
+    close_artifact_writers()
+    if fresh:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    _manifest = ArtifactManifest(path)
+    _record_entries = True
+    return _manifest
+
+def close_manifest():
+    global _manifest, _record_entries
+    if _manifest is not None:
+        close_artifact_writers() # Records the final size and hash of every stream
+        _manifest.close()
+        _manifest = None
+        _record_entries = False
+
+# Commands that never return on their own (follow modes, pagers, editors, unbounded loops).
+# They are recorded in the artifacts but never spawned.
+NEVER_TERMINATING_PATTERNS = [
+    re.compile(r'\b(tail|journalctl)\b.*\s-[a-zA-Z]*[fF]\b'), # tail -f / journalctl -f
+    re.compile(r'\bping\b(?!.*\s-c\s*\d)'),                  # ping without a count
+    re.compile(r'^top\b(?!.*\s-n\s*\d)'),                     # interactive top
+    re.compile(r'\bdocker-compose\s+up\b(?!.*\s-d\b)'),       # attached compose
+    re.compile(r'^(vim?|nano|emacs|less|more|watch|visudo)\b'),
+]
+
+def is_never_terminating(command):
+    command = command[5:] if command.startswith('sudo ') else command
+    return any(p.search(command) for p in NEVER_TERMINATING_PATTERNS)
+
+class CommandExecutor:
+    # Runs simulated commands on a bounded worker pool. Each command gets its own process group and a timeout;
+    # when the timeout hits the whole group is killed, so shells with children (pipes, "&&") can't linger.
+    # With dry_run=True nothing is spawned at all (artifact-only mode).
+    def __init__(self, max_workers=4, timeout=5.0, dry_run=False, max_pending=None):
+        self.timeout = timeout
+        self.dry_run = dry_run
+        self.stats = {'executed': 0, 'timed_out': 0, 'skipped': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+        self._pool = None if dry_run else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tuxtrace-exec')
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 4) # Backpressure on queued commands
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+        if key == 'skipped':
+            instrumentation.count('subprocess.skipped')
+
+    def _run(self, command):
+        instrumentation.count('subprocess.spawned')
+        with instrumentation.timer('subprocess'):
+            try:
+                proc = subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            except OSError:
+                self._count('failed')
+                return
+            try:
+                proc.wait(timeout=self.timeout)
+                self._count('executed')
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                proc.wait()
+                self._count('timed_out')
+                instrumentation.count('subprocess.timed_out')
+
+    def _done(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def submit(self, command):
+        if self.dry_run or is_never_terminating(command):
+            self._count('skipped')
+            return None
+        self._slots.acquire()
+        future = self._pool.submit(self._run, command)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def wait(self):
+        # Blocks until every command submitted so far has finished or been killed
+        with self._pending_lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+def shared_command_executor():
+    # Process-wide executor so concurrent simulators share one bounded pool instead of spawning freely
+    global _shared_executor
+    if _shared_executor is None:
+        with _shared_executor_lock:
+            if _shared_executor is None:
+                _shared_executor = CommandExecutor()
+    return _shared_executor
+
+class ActivityModel:
+    # When a simulated user is at the keyboard: working hours on workdays, the occasional weekend or late-night
+    # session, sessions of a few dozen commands, and bursts of quickly typed commands inside a session.
+    def __init__(self, work_start=9, work_end=18, workdays=(0, 1, 2, 3, 4), weekend_activity=0.2,
+                 off_hours_activity=0.1, commands_per_session=25, burst_probability=0.3,
+                 burst_gap=(1, 8), think_gap=(15, 240)):
+        self.work_start = work_start
+        self.work_end = work_end
+        self.workdays = workdays
+        self.weekend_activity = weekend_activity # Chance a non-workday has any activity
+        self.off_hours_activity = off_hours_activity # Chance a session starts outside working hours
+        self.commands_per_session = commands_per_session
+        self.burst_probability = burst_probability
+        self.burst_gap = burst_gap # Seconds between commands typed in a burst
+        self.think_gap = think_gap # Seconds between commands otherwise
+
+class WallClock:
+    # Default clock: artifacts are stamped with the real time they're written at (plus the user's start offset)
+    deterministic = False
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+
+    def timestamps(self, n):
+        for _ in range(n):
+            yield time.time() + self.offset
+
+    def random_time(self, rng=random):
+        return time.time() + self.offset
+
+class Timeline:
+    # Virtual clock that spreads n commands over the last `days` days following an ActivityModel,
+    # so a month of history is produced in seconds. Timestamps are generated lazily and always increase.
+    def __init__(self, days=30, end=None, model=None, rng=None):
+        self.days = days
+        self.deterministic = end is not None # Ending "now" gives different timestamps on every run
+        self.end = end if end is not None else time.time()
+        self.start = self.end - days * 86400
+        self.model = model or ActivityModel()
+        self.rng = rng or random.Random()
+
+    def _active_days(self):
+        model = self.model
+        first = datetime.fromtimestamp(self.start).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = []
+        for i in range(self.days + 1):
+            day = first + timedelta(days=i)
+            if day.timestamp() >= self.end:
+                break # Nothing of this day happens before the end (e.g. --history-end 2024-05-31 means midnight)
+            if day.weekday() in model.workdays or self.rng.random() < model.weekend_activity:
+                days.append(day.timestamp())
+        return days or [first.timestamp()]
+
+    def _session_start(self, day):
+        model = self.model
+        if self.rng.random() < model.off_hours_activity:
+            hour = self.rng.choice([h for h in range(24) if not model.work_start <= h < model.work_end])
+        else:
+            hour = self.rng.randrange(model.work_start, model.work_end)
+        start = day + hour * 3600 + self.rng.uniform(0, 3600)
+        if not self.start <= start < self.end: # That hour of the first or last day lies outside the window
+            start = self.rng.uniform(max(day, self.start), min(day + 86400, self.end))
+        return start
+
+    def timestamps(self, n):
+        model, rng = self.model, self.rng
+        days = self._active_days()
+        per_day, extra = divmod(n, len(days))
+        extra_days = set(rng.sample(range(len(days)), extra))
+        sessions = [] # (start, commands), in time order: days are in order and each day's starts are sorted
+        for i, day in enumerate(days):
+            quota = per_day + (i in extra_days)
+            if not quota:
+                continue
+            count = max(1, round(quota / model.commands_per_session))
+            base, rest = divmod(quota, count)
+            starts = sorted(self._session_start(day) for _ in range(count))
+            sessions.extend((start, base + (j < rest)) for j, start in enumerate(starts))
+        for j, (start, count) in enumerate(sessions):
+            gaps = [rng.uniform(*(model.burst_gap if rng.random() < model.burst_probability else model.think_gap))
+                    for _ in range(count)]
+            # A session ends before the next one starts (the last one by the end of the window): when its gaps don't
+            # fit, they are shrunk to the room there is rather than piling the remaining commands onto one second
+            room = (sessions[j + 1][0] if j + 1 < len(sessions) else self.end) - start
+            total = sum(gaps)
+            scale = room / total if total > room else 1.0
+            ts, limit = start, start + room
+            for gap in gaps:
+                ts = min(ts + gap * scale, limit) # min() only absorbs float rounding of the scaled sum
+                yield ts
+
+    def random_time(self, rng=None):
+        return (rng or self.rng).uniform(self.start, self.end)
+
+class SyntheticAccounts:
+    # passwd/shadow/group under a target root directory, edited directly instead of calling useradd/chpasswd.
+    # Used by the offline --root mode, so no subprocesses and no privileges are needed.
+    # Accounts of seeded runs are reproducible: the shadow salt and last-change date come from the seed (or the
+    # timeline end), and prepare_accounts() creates a scenario's users in scenario order so UIDs don't depend on
+    # which thread or worker gets there first.
+    _lock = threading.Lock()
+    SALT_CHARS = './0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+    def __init__(self, root, seed=None, last_change=None):
+        self.root = root
+        self.etc = os.path.join(root, 'etc')
+        self.passwd = os.path.join(self.etc, 'passwd')
+        self.shadow = os.path.join(self.etc, 'shadow')
+        self.group = os.path.join(self.etc, 'group')
+        for d in ('etc', 'home', 'root', 'tmp', 'var/log'):
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+        if not os.path.exists(self.passwd):
+            self._append(self.passwd, "root:x:0:0:root:/root:/bin/bash\n")
+            self._append(self.shadow, f"root:*:{self._days('root', seed, last_change)}:0:99999:7:::\n")
+            self._append(self.group, "root:x:0:\n")
+
+    @staticmethod
+    def _append(path, line):
+        with open(path, 'a') as f:
+            f.write(line)
+
+    def lookup(self, username):
+        # Returns the passwd fields (uid, gid, home) for username, or None
+        try:
+            with open(self.passwd) as f:
+                for line in f:
+                    fields = line.rstrip('\n').split(':')
+                    if fields[0] == username and len(fields) >= 7:
+                        return int(fields[2]), int(fields[3]), fields[5]
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _accounts(self):
+        # username -> (uid, gid, home) of everything in passwd
+        accounts = {}
+        with open(self.passwd) as f:
+            for line in f:
+                fields = line.rstrip('\n').split(':')
+                if len(fields) >= 7 and fields[2].isdigit():
+                    accounts[fields[0]] = (int(fields[2]), int(fields[3]), fields[5])
+        return accounts
+
+    @staticmethod
+    def _days(username, seed, last_change):
+        # shadow(5) date of the last password change, in days since the epoch: the timeline end when there is one,
+        # a fixed day in 2020-2024 for a seeded run without one, today otherwise
+        if last_change is None and seed is not None:
+            last_change = 1_580_000_000 + derive_seed(seed, username, 'chage') % (4 * 365 * 86400)
+        return int((time.time() if last_change is None else last_change) // 86400)
+
+    @classmethod
+    def _password_hash(cls, password, username=None, seed=None):
+        try:
+            import warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)
+                import crypt
+            if seed is None:
+                salt = crypt.mksalt(crypt.METHOD_SHA512)
+            else:
+                rng = random.Random(derive_seed(seed, username, 'salt'))
+                salt = '$6$' + ''.join(rng.choice(cls.SALT_CHARS) for _ in range(16))
+            return crypt.crypt(password, salt)
+        except ImportError: # crypt is gone on newer Pythons: leave the account locked
+            return '!'
+
+    def add_users(self, users, password='password'):
+        # Same result as "useradd -m -s /bin/bash" + chpasswd for every (username, seed, last_change) not there yet,
+        # written straight into the target tree. New UIDs are handed out in the order given.
+        with self._lock, open(os.path.join(self.etc, '.pwd.lock'), 'w') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX) # Other processes rendering into the same root
+            accounts = self._accounts()
+            used = {uid for uid, _, _ in accounts.values()}
+            passwd, shadow, group = [], [], []
+            uid = 1000
+            for username, seed, last_change in users:
+                if username in accounts:
+                    continue
+                while uid in used:
+                    uid += 1
+                used.add(uid)
+                home = f"/home/{username}"
+                passwd.append(f"{username}:x:{uid}:{uid}::{home}:/bin/bash\n")
+                shadow.append(f"{username}:{self._password_hash(password, username, seed)}:"
+                              f"{self._days(username, seed, last_change)}:0:99999:7:::\n")
+                group.append(f"{username}:x:{uid}:\n")
+                accounts[username] = (uid, uid, home)
+                os.makedirs(os.path.join(self.root, home.lstrip('/')), exist_ok=True)
+            if passwd:
+                self._append(self.passwd, ''.join(passwd))
+                self._append(self.shadow, ''.join(shadow))
+                self._append(self.group, ''.join(group))
+            return accounts
+
+    def add_user(self, username, password='password', seed=None, last_change=None):
+        return self.add_users([(username, seed, last_change)], password)[username]
+
+def prepare_accounts(users_config):
+    # Creates the accounts of every --root user up front, in config order, before any of them runs concurrently
+    by_root = {}
+    for config in users_config:
+        if config.get('root'):
+            by_root.setdefault(os.path.abspath(config['root']), []).append(config)
+    for root, configs in by_root.items():
+        users = []
+        for config in configs:
+            end = parse_history_end(config.get('history_end')) if config.get('history_days') else None
+            users.append((config.get('user') or os.getenv('SUDO_USER', os.getenv('USER')), config.get('seed'), end))
+        SyntheticAccounts(root, *users[0][1:]).add_users(users)
+
+# Binary login databases, glibc x86_64 layout (see utmp(5) and lastlog(8))
+UTMP_STRUCT = struct.Struct('<hxxi32s4s32s256shhiii4i20s') # 384 bytes per record
+LASTLOG_STRUCT = struct.Struct('<i32s256s') # 292 bytes, record N belongs to UID N
+LOGIN_PROCESS, USER_PROCESS, DEAD_PROCESS = 6, 7, 8
+SESSION_IDLE_GAP = 1800 # Commands further apart than this belong to different login sessions
+
+def _ipv4_to_utmp(ip):
+    # ut_addr_v6[0] holds the IPv4 address in network byte order
+    return struct.unpack('<i', socket.inet_aton(ip))[0]
+
+def pack_utmp_records(records):
+    # records: iterable of (type, pid, line, user, host, timestamp). Packed into one preallocated buffer.
+    records = list(records)
+    buffer = bytearray(UTMP_STRUCT.size * len(records))
+    for i, (ut_type, pid, line, user, host, timestamp) in enumerate(records):
+        UTMP_STRUCT.pack_into(
+            buffer, i * UTMP_STRUCT.size,
+            ut_type, pid, line.encode(), line[-4:].encode(), user.encode(), host.encode(),
+            0, 0, pid, int(timestamp), int(timestamp % 1 * 1_000_000),
+            _ipv4_to_utmp(host) if host else 0, 0, 0, 0, b''
+        )
+    return bytes(buffer)
+
+_lastlog_lock = threading.Lock()
+
+def write_lastlog(path, uid, timestamp, line, host):
+    # lastlog is sparse and indexed by UID: grow the file to cover the record (holes stay unallocated) and
+    # patch that one slot through mmap instead of rewriting the file
+    offset = uid * LASTLOG_STRUCT.size
+    with _lastlog_lock, open(path, 'a+b') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_size < offset + LASTLOG_STRUCT.size:
+                f.truncate(offset + LASTLOG_STRUCT.size)
+            with mmap.mmap(f.fileno(), 0) as mapped:
+                current = LASTLOG_STRUCT.unpack_from(mapped, offset)[0]
+                if timestamp >= current: # Never move a newer last login backwards
+                    LASTLOG_STRUCT.pack_into(mapped, offset, int(timestamp), line.encode(), host.encode())
+                    instrumentation.count(f"bytes:{path}", LASTLOG_STRUCT.size)
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+# Synthetic home-directory trees: (directory, file names or extensions, weight) per profile.
+# {project}/{service}/{hex} are filled in per file; an entry without a leading '.' is a fixed file name.
+HOME_LAYOUTS = {
+    UserProfile.DEVELOPER: [
+        ("projects/{project}/src", ('.py', '.js', '.go', '.c', '.h'), 8),
+        ("projects/{project}/tests", ('.py', '.js'), 3),
+        ("projects/{project}/docs", ('.md', '.rst', '.txt'), 2),
+        ("projects/{project}", ('README.md', 'Makefile', 'setup.cfg', 'requirements.txt', 'package.json'), 1),
+        (".cache/pip/http/{hex}", ('.bin',), 2),
+        ("Downloads", ('.tar.gz', '.zip', '.deb'), 1),
+        ("vm", ('.qcow2', '.img'), 0.02)
+    ],
+    UserProfile.ADMIN: [
+        ("configs/{service}", ('.conf', '.yaml', '.ini', '.json'), 6),
+        ("scripts", ('.sh', '.py'), 3),
+        ("backups/{service}", ('.tar.gz', '.sql', '.zip'), 2),
+        ("reports", ('.pdf', '.csv', '.txt'), 2),
+        (".ssh", ('known_hosts', 'config', 'authorized_keys'), 0.3),
+        ("images", ('.iso', '.img'), 0.02)
+    ],
+    UserProfile.SYSADMIN: [
+        ("scripts", ('.sh', '.py', '.pl'), 5),
+        ("logs/{service}", ('.log', '.log.1', '.gz'), 5),
+        ("monitoring/{service}", ('.yaml', '.json', '.conf'), 3),
+        ("backups", ('.tar.gz', '.gz'), 1),
+        ("images", ('.iso', '.qcow2'), 0.02)
+    ],
+    UserProfile.GENERAL: [
+        ("Documents", ('.docx', '.odt', '.pdf', '.txt'), 5),
+        ("Pictures", ('.jpg', '.png'), 4),
+        ("Music", ('.mp3',), 2),
+        ("Downloads", ('.zip', '.pdf', '.deb', '.tar.gz'), 2),
+        ("Desktop", ('.txt', '.desktop'), 1),
+        ("Videos", ('.iso', '.img'), 0.02)
+    ]
+}
+LAYOUT_SERVICES = ['nginx', 'postgres', 'redis', 'docker', 'prometheus', 'grafana', 'haproxy', 'bind', 'ssh', 'mysql']
+BINARY_EXTENSIONS = {'.tar.gz', '.zip', '.deb', '.bin', '.pdf', '.docx', '.odt', '.jpg', '.png', '.mp3', '.gz',
+                     '.iso', '.img', '.qcow2'}
+SPARSE_EXTENSIONS = {'.iso', '.img', '.qcow2'} # Disk images: mostly holes, like the real thing
+# Leading signature bytes, so carving tools recognise the file type
+FILE_MAGIC = {
+    '.pdf': b'%PDF-1.4\n', '.zip': b'PK\x03\x04', '.docx': b'PK\x03\x04', '.odt': b'PK\x03\x04', '.jpg': b'\xff\xd8\xff\xe0',
+    '.png': b'\x89PNG\r\n\x1a\n', '.gz': b'\x1f\x8b\x08\x00', '.tar.gz': b'\x1f\x8b\x08\x00', '.mp3': b'ID3\x03\x00',
+    '.deb': b'!<arch>\n', '.qcow2': b'QFI\xfb', '.img': b'\xeb\x63\x90'
+}
+CRON_SCRIPT_BODIES = {
+    'python': "import os\nimport shutil\n\n# {comment}\nfor name in os.listdir('{dir}'):\n    if name.endswith('.tmp'):\n        os.remove(os.path.join('{dir}', name))\n",
+    'perl': "use strict;\nuse warnings;\n\n# {comment}\nopendir(my $dh, '{dir}') or die;\nprint scalar(grep {{ !/^\\./ }} readdir($dh)), \"\\n\";\n",
+    'ruby': "require 'fileutils'\n\n# {comment}\nDir.glob('{dir}/*.tmp').each {{ |f| FileUtils.rm_f(f) }}\n",
+    'node': "const fs = require('fs');\n\n// {comment}\nfor (const f of fs.readdirSync('{dir}')) if (f.endsWith('.tmp')) fs.unlinkSync('{dir}/' + f);\n",
+    'bash': "set -e\n\n# {comment}\nfind '{dir}' -name '*.tmp' -mtime +7 -delete\ntar -czf /tmp/$(date +%F).tar.gz '{dir}' 2>/dev/null || true\n"
+}
+
+class ContentCorpus:
+    # A few MB of pre-generated file content (a text region and a random-bytes region) in one unlinked temp file.
+    # Synthesised files are filled with slices of it by copy_file_range/sendfile, so the bytes never pass through
+    # Python. Built once per process from fixed seeds, so the same slice always has the same content.
+    TEXT_SIZE = 4 * 1024 * 1024
+    BINARY_SIZE = 4 * 1024 * 1024
+    _shared = None
+    _shared_lock = threading.Lock()
+    _copy_mode = 'copy_file_range' if hasattr(os, 'copy_file_range') else 'sendfile'
+
+    def __init__(self):
+        import tempfile
+        from faker import Faker
+        fake = Faker()
+        fake.seed_instance(0)
+        rng = random.Random(0)
+        self.words = sorted(set(w.lower() for w in fake.words(nb=3000) if w.isalpha()))
+        paragraphs = [p.encode() + b'\n' for p in fake.paragraphs(nb=500)]
+        text = bytearray()
+        while len(text) < self.TEXT_SIZE:
+            rng.shuffle(paragraphs)
+            text += b''.join(paragraphs)
+        self.file = tempfile.TemporaryFile(prefix='tuxtrace-corpus-')
+        self.file.write(text[:self.TEXT_SIZE])
+        self.file.write(rng.randbytes(self.BINARY_SIZE))
+        self.file.flush()
+        self.fd = self.file.fileno()
+        self.regions = {'text': (0, self.TEXT_SIZE), 'binary': (self.TEXT_SIZE, self.BINARY_SIZE)}
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                with instrumentation.timer('corpus.build'):
+                    cls._shared = cls()
+            return cls._shared
+
+    def _copy(self, fd, offset, count):
+        # Kernel-side copy from the corpus into fd at its current position. copy_file_range can refuse
+        # (cross-filesystem on older kernels, some filesystems): then sendfile, and plain pread/write last.
+        while count:
+            try:
+                if ContentCorpus._copy_mode == 'copy_file_range':
+                    n = os.copy_file_range(self.fd, fd, count, offset)
+                elif ContentCorpus._copy_mode == 'sendfile':
+                    n = os.sendfile(fd, self.fd, offset, count)
+                else:
+                    n = os.write(fd, os.pread(self.fd, min(count, 1 << 20), offset))
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP) or ContentCorpus._copy_mode == 'pread':
+                    raise
+                ContentCorpus._copy_mode = 'sendfile' if ContentCorpus._copy_mode == 'copy_file_range' else 'pread'
+                continue
+            if n == 0:
+                break
+            offset += n
+            count -= n
+
+    def fill(self, fd, region, size, rng):
+        # Writes `size` bytes of the region starting at a random offset, wrapping around for files larger than it
+        start, length = self.regions[region]
+        offset = rng.randrange(length)
+        while size > 0:
+            chunk = min(size, length - offset)
+            self._copy(fd, start + offset, chunk)
+            size -= chunk
+            offset = 0
+
+class FilesystemSynthesizer:
+    # Builds a profile-specific tree of files under a home directory (projects for developers, configs and backups
+    # for admins, documents and media for general users), plus the scripts cron jobs point at.
+    # Paths are planned in batches: all directories of a batch are created first, then every file is filled from
+    # the ContentCorpus, then timestamps/ownership are applied, so the per-file Python work is a handful of syscalls.
+    BATCH_SIZE = 1024
+
+    def __init__(self, home, profile, rng, uid=None, gid=None, mtime=None, end=None, target=None, corpus=None):
+        self.home = home
+        self.layout = HOME_LAYOUTS[profile]
+        self.weights = [weight for _, _, weight in self.layout]
+        self.rng = rng
+        self.uid, self.gid = uid, gid
+        self.mtime = mtime or (lambda rng: time.time() - rng.uniform(0, 90 * 86400)) # Files from the last few months
+        self.end = end # Latest access time (the timeline end); now by default
+        self.target = target or (lambda path: path) # System path -> path on disk (--root)
+        self.corpus = corpus or ContentCorpus.shared()
+        self.files = 0
+        self.bytes_written = 0 # Data actually written
+        self.logical_bytes = 0 # Apparent size, including the holes of sparse files
+        self._dirs = set()
+        self._names = set()
+
+    def _name(self, words, extension):
+        if not extension.startswith('.'):
+            return extension
+        return self.rng.choice(words) + self.rng.choice(['', '_', '-']) + self.rng.choice(words) + extension
+
+    def _size(self, extension):
+        rng = self.rng
+        if extension in SPARSE_EXTENSIONS:
+            return rng.randint(256, 4096) * 1024 * 1024 # 256 MB - 4 GB apparent size
+        if extension in BINARY_EXTENSIONS:
+            return min(int(rng.lognormvariate(11.5, 1.4)), 64 * 1024 * 1024) # ~100 KB median
+        return max(16, min(int(rng.lognormvariate(8.5, 1.2)), 2 * 1024 * 1024)) # ~5 KB median
+
+    def plan(self, count):
+        # Yields (path, extension, size, mtime) for `count` files
+        rng, words = self.rng, self.corpus.words
+        projects = [rng.choice(words) + rng.choice(['', '-api', '-cli', '-web', 'd']) for _ in range(rng.randint(1, 4))]
+        services = rng.sample(LAYOUT_SERVICES, rng.randint(2, 5))
+        for _ in range(count):
+            for attempt in range(8): # Fixed names (README.md, Makefile) exist once per directory: pick again
+                directory, names, _ = rng.choices(self.layout, self.weights)[0]
+                directory = directory.format(project=rng.choice(projects), service=rng.choice(services),
+                                             hex=f"{rng.randrange(256):02x}")
+                extension = rng.choice(names)
+                path = os.path.join(self.home, directory, self._name(words, extension))
+                if path not in self._names:
+                    break
+            else:
+                root, ext = os.path.splitext(path)
+                while path in self._names:
+                    path = f"{root}-{rng.randint(1, 999)}{ext}"
+            self._names.add(path)
+            yield path, extension, self._size(extension), self.mtime(rng)
+
+    def materialise(self, entries):
+        # One batch: directories, then contents, then metadata
+        for directory in sorted({os.path.dirname(path) for path, _, _, _ in entries} - self._dirs):
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        for path, extension, size, _ in entries:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                magic = FILE_MAGIC.get(extension, b'')
+                if magic:
+                    os.write(fd, magic)
+                if extension in SPARSE_EXTENSIONS:
+                    # A header and a trailer of data, everything in between is a hole
+                    self.corpus.fill(fd, 'binary', 64 * 1024, self.rng)
+                    os.lseek(fd, size - 64 * 1024, os.SEEK_SET)
+                    self.corpus.fill(fd, 'binary', 64 * 1024, self.rng)
+                    self.bytes_written += 128 * 1024 + len(magic)
+                else:
+                    self.corpus.fill(fd, 'binary' if extension in BINARY_EXTENSIONS else 'text', size - len(magic), self.rng)
+                    self.bytes_written += size
+            finally:
+                os.close(fd)
+            self.logical_bytes += size
+        self._apply_metadata([(path, mtime) for path, _, _, mtime in entries])
+        self.files += len(entries)
+        instrumentation.count('synth.files', len(entries))
+
+    def _apply_metadata(self, items):
+        end = self.end or time.time()
+        for path, mtime in items:
+            os.utime(path, (self.rng.uniform(mtime, max(mtime, end)), mtime)) # Read back some time later
+            if self.uid is not None:
+                try:
+                    os.chown(path, self.uid, self.gid)
+                except PermissionError:
+                    self.uid = None # Not privileged (e.g. an unprivileged --root run): keep our own ownership
+
+    def synthesize(self, count):
+        batch = []
+        for entry in self.plan(count):
+            batch.append(entry)
+            if len(batch) >= self.BATCH_SIZE:
+                self.materialise(batch)
+                batch = []
+        if batch:
+            self.materialise(batch)
+
+    def cron_scripts(self, scripts):
+        # scripts: (interpreter, system path) pairs; each path gets a short script in the interpreter's language
+        items = []
+        for interpreter, script in scripts:
+            language = next((key for key in CRON_SCRIPT_BODIES if key in interpreter), 'bash')
+            body = CRON_SCRIPT_BODIES[language].format(
+                comment=' '.join(self.rng.choice(self.corpus.words) for _ in range(6)).capitalize(),
+                dir=os.path.dirname(script))
+            path = self.target(script)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(f"#!{interpreter}\n{body}")
+            os.chmod(path, 0o755)
+            self.bytes_written += len(body)
+            items.append((path, self.mtime(self.rng)))
+        self._apply_metadata(items)
+        self.files += len(items)
+
+TUXTRACE_VERSION = "1.1"
+
+class ArtifactRecorder:
+    # Tees everything one simulator writes into a cache staging directory: appends are streamed into one blob per
+    # target file, created files are stored whole. Paths are kept relative to the target root so an entry can be
+    # replayed into any --root directory.
+    def __init__(self, directory, key):
+        self.directory = directory
+        self.key = key
+        self.ops = []
+        self.bytes = 0
+        self._appends = {} # relative path -> (open blob file, its op)
+        os.makedirs(directory)
+
+    def _blob(self):
+        return os.path.join(self.directory, str(len(self.ops)))
+
+    def append(self, rel, data, entries=None):
+        if rel not in self._appends:
+            path = self._blob()
+            self.ops.append({'op': 'append', 'path': rel, 'blob': os.path.basename(path), 'entries': []})
+            self._appends[rel] = (open(path, 'wb'), self.ops[-1])
+        blob, op = self._appends[rel]
+        if entries:
+            op['entries'].extend([blob.tell() + pos, length, list(meta)] for pos, length, meta in entries)
+        blob.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+    def create(self, rel, data, atime=None, mtime=None):
+        path = self._blob()
+        with open(path, 'wb') as f:
+            f.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+        self.ops.append({'op': 'create', 'path': rel, 'blob': os.path.basename(path), 'atime': atime, 'mtime': mtime})
+
+    def lastlog(self, timestamp, line, host):
+        self.ops.append({'op': 'lastlog', 'timestamp': timestamp, 'line': line, 'host': host})
+
+    def synthesize(self, files, scripts):
+        # Synthesised trees are regenerated from the seed on replay rather than stored (they can be GBs)
+        self.ops.append({'op': 'synthesize', 'files': files, 'scripts': scripts})
+
+    def finish(self, summary):
+        for blob, _ in self._appends.values():
+            self.bytes += blob.tell()
+            blob.close()
+        self.bytes += sum(os.path.getsize(os.path.join(self.directory, op['blob']))
+                          for op in self.ops if op['op'] == 'create')
+        with open(os.path.join(self.directory, 'manifest.json'), 'w') as f:
+            json.dump({'key': self.key, 'bytes': self.bytes, 'ops': self.ops, 'summary': summary}, f)
+
+    def abort(self):
+        for blob, _ in self._appends.values():
+            blob.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def copy_file(source, target):
+    # Private copy of source (never a hardlink: later in-place writes to the image must not reach the cache).
+    # copy_file_range shares extents on filesystems that support it (btrfs, XFS), so it is often free anyway;
+    # shutil.copyfile when the kernel refuses it.
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if n == 0:
+                    break
+                remaining -= n
+            return
+        except (AttributeError, OSError) as e: # No copy_file_range in this Python, or not for these files
+            if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    shutil.copyfile(source, target)
+
+class ArtifactCache:
+    # On-disk cache of rendered artifacts for seeded, deterministic runs, keyed by (seed, profile, counts, version, ...).
+    # A hit replays the stored output with sendfile/copy_file_range instead of regenerating it.
+    # Entries are evicted least-recently-used first once the cache grows past max_bytes.
+    _opened = {}
+    _opened_lock = threading.Lock()
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def open(cls, directory, max_bytes=1 << 30):
+        # One instance per cache directory and process
+        key = os.path.abspath(directory)
+        with cls._opened_lock:
+            if key not in cls._opened:
+                cls._opened[key] = cls(directory, max_bytes)
+            return cls._opened[key]
+
+    _source_hash = None
+
+    @classmethod
+    def make_key(cls, parts):
+        if cls._source_hash is None: # Any change to the generator invalidates old entries
+            with open(os.path.abspath(__file__), 'rb') as f:
+                cls._source_hash = hashlib.sha256(f.read()).hexdigest()
+        blob = json.dumps(dict(parts, version=TUXTRACE_VERSION, source=cls._source_hash), sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def lookup(self, key):
+        entry = os.path.join(self.directory, key)
+        manifest = os.path.join(entry, 'manifest.json')
+        try:
+            with open(manifest) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(entry) # Entry mtime doubles as the LRU clock
+        return entry, data
+
+    def recorder(self, key):
+        staging = os.path.join(self.directory, f".tmp-{key[:16]}-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        return ArtifactRecorder(staging, key)
+
+    def commit(self, recorder, summary):
+        recorder.finish(summary)
+        try:
+            os.rename(recorder.directory, os.path.join(self.directory, recorder.key))
+        except OSError: # Someone else stored the same entry first
+            shutil.rmtree(recorder.directory, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.tmp-'):
+                continue
+            try:
+                with open(os.path.join(path, 'manifest.json')) as f:
+                    size = json.load(f).get('bytes', 0)
+                entries.append((os.stat(path).st_mtime, size, path))
+                total += size
+            except (OSError, ValueError):
+                continue
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+class SimulationInterrupted(Exception):
+    pass
+
+_stop_requested = threading.Event() # Set on Ctrl-C: journaled simulators stop at their next checkpoint
+
+class CheckpointJournal:
+    # Append-only JSON-lines journal of a batch run, for --resume. Records:
+    #   run       scenario fingerprint and the shared files' sizes before anything was written
+    #   start     users about to write, with the sizes of the files they append to
+    #   progress  commands emitted so far and current file sizes, every `interval` commands (informational only)
+    #   done      users whose output is complete, with the file sizes right after it was flushed
+    # On resume every file is cut back to the size in the latest record that mentions it, which drops exactly the
+    # output of users that didn't finish, and the finished users are skipped.
+    # A user is the unit of resume: timeline and session generators can't be serialised, so an interrupted user
+    # is regenerated from the start (identically, when seeded).
+    def __init__(self, path, interval=1000):
+        self.path = path
+        self.interval = interval
+        self.done = set()
+        self.truncated = {} # path -> size it was cut back to on resume
+        self.started = {} # path -> size before the run first wrote to it (see merge_shared_artifacts)
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(users_config):
+        return hashlib.sha256(json.dumps(users_config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _read(self):
+        records = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break # Torn last line from a crash mid-write
+        return records
+
+    def open(self, users_config, shared_paths, resume=False):
+        fingerprint = self.fingerprint(users_config)
+        if resume and os.path.exists(self.path):
+            records = self._read()
+            if not records or records[0].get('event') != 'run' or records[0].get('fingerprint') != fingerprint:
+                raise ValueError(f"checkpoint {self.path} was written for a different scenario")
+            self.started = records[0].get('offsets', {})
+            offsets = {}
+            for record in records:
+                offsets.update(record.get('offsets', {}))
+                if record['event'] == 'done':
+                    self.done.update(record['users'])
+            for path, size in offsets.items():
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    os.truncate(path, size)
+                    self.truncated[path] = size
+            self._file = open(self.path, 'a')
+            self._file.seek(0, os.SEEK_END)
+            self._append({'event': 'resume', 'time': time.time()})
+        else:
+            self._file = open(self.path, 'w')
+            self.started = self._offsets(shared_paths)
+            self._append({'event': 'run', 'fingerprint': fingerprint, 'time': time.time(), 'offsets': self.started})
+        return self
+
+    @staticmethod
+    def _offsets(paths):
+        # File sizes once everything buffered for them has been written
+        offsets = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            get_artifact_writer(path).flush()
+            offsets[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        return offsets
+
+    def _append(self, record):
+        # Flushed to the OS on every record: survives crashes and interrupts of this process
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def begin(self, users, paths):
+        with self._lock:
+            self._append({'event': 'start', 'users': users, 'offsets': self._offsets(paths)})
+
+    def progress(self, user, commands, paths):
+        with self._lock:
+            self._append({'event': 'progress', 'users': [user], 'commands': commands, 'sizes': self._offsets(paths)})
+
+    def commit(self, users, artifacts=None, paths=()):
+        # Writes the users' pending artifacts and records them as done, under one lock so no other
+        # user's output can land between the flush and the recorded offsets
+        artifacts = artifacts or {}
+        with self._lock:
+            for path, (data, entries) in artifacts.items():
+                if data:
+                    get_artifact_writer(path).write(data, entries)
+            offsets = self._offsets(set(artifacts) | set(paths))
+            if _manifest is not None:
+                # The users' manifest rows and stream hashes must be stored before they count as done
+                for path in offsets:
+                    get_artifact_writer(path).checkpoint()
+                _manifest.flush()
+            self._append({'event': 'done', 'users': users, 'offsets': offsets})
+            self.done.update(users)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class LinuxUserSimulator:
+    def __init__(self, num_commands=50, num_sudo=10, num_cronjobs=3, user=None, profile=UserProfile.GENERAL, value_pool=None, start_offset=0.0, execute=True, executor=None, timeline=None, root=None, session_model=None, seed=None, cache=None, home_files=0, journal=None):
+        self.num_commands = num_commands
+        self.num_sudo = num_sudo
+        self.num_cronjobs = num_cronjobs
+        self.home_files = home_files # Files to synthesise under the home directory (0 = none, and no cron scripts)
+        self.user = user or os.getenv('SUDO_USER', os.getenv('USER'))
+        self.profile = profile if isinstance(profile, UserProfile) else UserProfile(profile)
+        # With a seed every user gets independent, reproducible streams (own RNG and own seeded Faker pool),
+        # so the output doesn't depend on how concurrent users interleave
+        self.seed = seed
+        if seed is not None:
+            self.rng = random.Random(derive_seed(seed, self.user))
+            self.fake = value_pool or FakerValuePool(batch_size=64, seed=derive_seed(seed, self.user, 'faker'))
+        else:
+            self.rng = random.Random()
+            self.fake = value_pool or shared_value_pool() # Pooled Faker values, shared across simulators
+        self.cache = ArtifactCache.open(cache) if isinstance(cache, str) else cache
+        self._recorder = None
+        # With a CheckpointJournal, appends to files shared with other users are held back until this user is done,
+        # so an interrupted user never leaves partial lines in auth.log/crontab/wtmp
+        self.journal = journal
+        self._staged = {}
+        # root renders everything into a directory tree instead of the live system (no subprocesses, no privileges)
+        self.root = os.path.abspath(root) if root else None
+        self.accounts = None
+        # execute=False is the artifact-only mode: commands are recorded but no shell is ever spawned
+        self.executor = (executor or shared_command_executor()) if execute and not self.root else None
+        self.start_offset = start_offset # Seconds this user's session starts after the run began (staggered multi-user starts)
+        self.timeline = timeline # Optional Timeline: backdates every artifact instead of using the wall clock
+        if timeline is not None and seed is not None:
+            timeline.rng = self.rng
+        self.clock = timeline or WallClock(start_offset)
+        if self.root:
+            # Reproducible shadow entries for seeded runs: the timeline end as the last password change
+            self.last_change = timeline.end if timeline is not None and timeline.deterministic else None
+            self.accounts = SyntheticAccounts(self.root, seed, self.last_change)
+        with instrumentation.timer('ensure_user_exists'):
+            self.ensure_user_exists(self.user)
+        if self.accounts:
+            self.uid, self.gid, home = self.accounts.lookup(self.user)
+            self.home_dir = self.target_path(home)
+        else:
+            entry = pwd.getpwnam(self.user)
+            self.uid, self.gid, self.home_dir = entry.pw_uid, entry.pw_gid, entry.pw_dir
+        self.bash_history = os.path.join(self.home_dir, '.bash_history')
+        self.bashrc = os.path.join(self.home_dir, '.bashrc')
+        self.auth_log = self.target_path('/var/log/auth.log')
+        self.crontab = self.target_path('/etc/crontab')
+        self.sudoers = self.target_path('/etc/sudoers')
+        self.tmp_dir = self.target_path('/tmp')
+        self.wtmp = self.target_path('/var/log/wtmp')
+        self.btmp = self.target_path('/var/log/btmp')
+        self.lastlog = self.target_path('/var/log/lastlog')
+        self.shared_artifacts = (self.auth_log, self.crontab, self.wtmp, self.btmp)
+        self.commands_emitted = 0 # Commands stream straight to disk, only the count is kept
+        self.cron_scripts = [] # (interpreter, path) of every script a cron job runs
+        self.synthesizer = None
+        self.sessions = [] # [first, last] command time of each login session, derived from the command stream
+        self.catalogue = CommandCatalogue.for_profile(self.profile)
+        # Optional Markov session model for plain commands: True for the profile's default, a path, or a SessionModel
+        if session_model is True:
+            session_model = SessionModel.for_profile(self.profile)
+        elif isinstance(session_model, str):
+            session_model = SessionModel.load(session_model)
+        self.session_model = session_model
+        self.session = session_model.walk(self.rng) if session_model else None
+        self.setup_directories()
+        
+        # Profile-specific adjustments
+        if self.profile == UserProfile.ADMIN:
+            self.num_sudo = max(self.num_sudo, int(self.num_commands * 0.4)) # It normalizes or boosts sudo usage numbers to match what’s expected for a user with elevated privileges like an ADMIN.
+            self.num_cronjobs = max(self.num_cronjobs, 5) # It ensures that the user has at least 5 cron jobs (self.num_cronjobs).
+        elif self.profile == UserProfile.DEVELOPER:
+            self.num_sudo = max(3, int(self.num_sudo * 0.5))
+        elif self.profile == UserProfile.SYSADMIN:
+            self.num_sudo = max(self.num_sudo, int(self.num_commands * 0.3))
+
+    def target_path(self, path):
+        # Where a system path lives on disk: itself on the live system, or under the --root tree
+        return os.path.join(self.root, path.lstrip('/')) if self.root else path
+
+    def ensure_user_exists(self, username):
+        if self.accounts:
+            if not self.accounts.lookup(username):
+                self.accounts.add_user(username, seed=self.seed, last_change=self.last_change)
+            return
+        try:
+            pwd.getpwnam(username)
+        except KeyError:
+            print(f"User {username} not found - creating...")
+            instrumentation.count('subprocess.spawned', 2) # useradd + chpasswd
+            try:
+                subprocess.run([
+                    'sudo', 'useradd',
+                    '-m',             # Create home directory
+                    '-s', '/bin/bash', # Set default shell
+                    username
+                ], check=True)
+                subprocess.run([
+                    'sudo', 'chpasswd',
+                ], input=f"{username}:password", encoding='ascii', check=True)
+                print(f"Created user {username} with home directory /home/{username}")
+            except subprocess.CalledProcessError as e:
+                print(f"Failed to create user: {e}")
+                sys.exit(1)
+
+    def setup_directories(self):
+        try:
+            # Backup original files if they exist
+            for f in [self.bash_history, self.bashrc]:
+                if os.path.exists(f):
+                    shutil.copy2(f, f + '.bak')
+        except Exception as e:
+            print(f"Warning: Could not backup files: {e}")
+
+    def generate_plausible_command(self, use_sudo=False):
+        # Only the chosen template gets its placeholders rendered (see CommandCatalogue)
+        template = self.catalogue.pick(use_sudo, self.rng)
+        command = template.render(self.fake, self.rng)
+        return "sudo " + command if use_sudo else command
+
+    def generate_commands(self, n, sudo_ratio=0.0):
+        # Batch API: a lazy stream of n commands, round(n * sudo_ratio) of them sudo
+        num_sudo = min(n, round(n * sudo_ratio))
+        return self.command_stream(n - num_sudo, num_sudo)
+
+    def command_stream(self, num_plain, num_sudo):
+        # Exact counts, with sudo commands spread through the session instead of all at the end.
+        # Each step picks sudo with probability remaining_sudo / remaining_total, so nothing is precomputed.
+        pick = self.catalogue.pick
+        fake, rng = self.fake, self.rng
+        num_plain = max(0, num_plain)
+        while num_plain or num_sudo:
+            use_sudo = rng.random() * (num_plain + num_sudo) < num_sudo
+            if use_sudo:
+                num_sudo -= 1
+            else:
+                num_plain -= 1
+            if use_sudo or self.session is None:
+                command = pick(use_sudo, rng).render(fake, rng)
+            else:
+                command = next(self.session).render(fake, rng)
+            yield "sudo " + command if use_sudo else command
+
+    def run_command(self, command, timestamp=None):
+        try:
+            if timestamp is None:
+                timestamp = time.time() + self.start_offset
+            if self.rng.random() > 0.2:
+                if command.startswith('sudo'):
+                    self.log_sudo_command(command, timestamp)
+                elif self.executor is not None:
+                    self.executor.submit(command) # Runs in the background, bounded by the executor's timeout
+            
+            self.commands_emitted += 1
+            return True
+        except Exception as e:
+            print(f"Error executing command: {e}")
+            return False
+
+    def log_sudo_command(self, command, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time() + self.start_offset
+        sudo_log_entry = (
+            f"{datetime.fromtimestamp(timestamp).strftime('%b %d %H:%M:%S')} {os.uname().nodename} "
+            f"sudo: {self.user} : TTY=pts/{self.rng.randint(0,3)} ; "
+            f"PWD={self.fake.file_path(depth=3)} ; USER=root ; "
+            f"COMMAND={command[5:]}\n"
+        ).encode('utf-8')
+        entries = [(0, len(sudo_log_entry), (self.user, 'sudo', command, timestamp))] if _record_entries else None
+        self.write_artifact(self.auth_log, sudo_log_entry, entries)
+
+    def artifact_writer(self, path):
+        if self.journal is not None and path in self.shared_artifacts:
+            if path not in self._staged:
+                self._staged[path] = ArtifactCollector(path)
+            return self._staged[path]
+        return get_artifact_writer(path)
+
+    def write_artifact(self, path, data, entries=None):
+        # Every append goes through the shared, buffered writer for that file.
+        # entries describe what data holds for the manifest: (byte offset in data, length, (user, kind, command, timestamp))
+        self.artifact_writer(path).write(data, entries)
+        if self._recorder is not None:
+            self._recorder.append(self.relative_path(path), data, entries)
+
+    def relative_path(self, path):
+        return os.path.relpath(path, self.root) if self.root else path.lstrip('/')
+
+    def cache_key(self):
+        # None when the run can't be reproduced: no seed, wall-clock timestamps, or real command execution
+        if self.cache is None or self.seed is None or not self.clock.deterministic or self.executor is not None:
+            return None
+        model = self.session_model
+        if isinstance(model, SessionModel):
+            model = model.digest()
+        return ArtifactCache.make_key({
+            'seed': self.seed, 'user': self.user, 'profile': self.profile.value,
+            'num_commands': self.num_commands, 'num_sudo': self.num_sudo, 'num_cronjobs': self.num_cronjobs,
+            'timeline': [self.timeline.days, self.timeline.end, vars(self.timeline.model)],
+            'session_model': model, 'host': os.uname().nodename, 'home_files': self.home_files,
+            'manifest': _record_entries # Entries are only cached when a manifest needs them
+        })
+
+    def replay_artifacts(self, entry, manifest):
+        for op in manifest['ops']:
+            if op['op'] == 'lastlog':
+                write_lastlog(self.lastlog, self.uid, op['timestamp'], op['line'], op['host'])
+                continue
+            if op['op'] == 'synthesize':
+                self.synthesize_home(op['files'], [tuple(script) for script in op['scripts']])
+                continue
+            target = self.target_path('/' + op['path'])
+            blob = os.path.join(entry, op['blob'])
+            if op['op'] == 'append':
+                entries = [(pos, length, tuple(meta)) for pos, length, meta in op.get('entries', ())]
+                self.artifact_writer(target).append_from(blob, entries)
+                continue
+            if os.path.lexists(target):
+                os.unlink(target) # Never write through a hardlink left by an older run into the cache entry
+            copy_file(blob, target)
+            if op['mtime'] is not None:
+                os.utime(target, (op['atime'], op['mtime']))
+        self.commands_emitted = manifest['summary']['commands']
+        self.sessions = manifest['summary']['sessions']
+
+    def create_artifact_file(self, path, content, atime=None, mtime=None):
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (atime, mtime))
+        if self._recorder is not None:
+            self._recorder.create(self.relative_path(path), content, atime, mtime)
+
+    def flush_artifacts(self):
+        for path in (self.bash_history, self.auth_log, self.crontab, self.bashrc, self.wtmp, self.btmp):
+            get_artifact_writer(path).flush()
+
+    def release_artifacts(self):
+        # This user's own files are done; only the shared auth.log/crontab/wtmp/btmp writers stay registered
+        for path in (self.bash_history, self.bashrc):
+            release_artifact_writer(path)
+
+    def add_to_bash_history(self, command, timestamp):
+        # One entry per call; the writer batches them, and an entry is never split across flushes
+        prefix = f"#{int(timestamp)}\n" if self.timeline is not None else "" # HISTTIMEFORMAT layout
+        if not _record_entries:
+            self.write_artifact(self.bash_history, f"{prefix}{command}\n")
+            return
+        data = f"{prefix}{command}\n".encode('utf-8')
+        # The manifest entry points at the command line itself, not its timestamp comment
+        self.write_artifact(self.bash_history, data, [(len(prefix), len(data) - len(prefix), (self.user, 'history', command, timestamp))])
+
+    def _block(self, header, lines, kind):
+        # header + lines as one append, with a manifest entry per line
+        data = (header + ''.join(lines)).encode('utf-8')
+        if not _record_entries:
+            return data, None
+        entries, pos = [], len(header.encode('utf-8'))
+        for line in lines:
+            length = len(line.encode('utf-8'))
+            entries.append((pos, length, (self.user, kind, line.rstrip('\n'), None)))
+            pos += length
+        return data, entries
+
+    def track_session(self, timestamp):
+        if self.sessions and timestamp - self.sessions[-1][1] <= SESSION_IDLE_GAP:
+            self.sessions[-1][1] = timestamp
+        else:
+            self.sessions.append([timestamp, timestamp])
+
+    def add_login_records(self):
+        # wtmp login/logout pairs around each session of commands, a few failed attempts in btmp,
+        # and the latest login in lastlog. All records are packed in memory and appended in one write.
+        hosts = [f"{self.rng.choice(['10.0', '10.10', '192.168', '172.16'])}.{self.rng.randint(0, 254)}.{self.rng.randint(1, 254)}"
+                 for _ in range(self.rng.randint(1, 3))] # The machines this user logs in from
+        wtmp, btmp = [], []
+        last = None
+        for first_cmd, last_cmd in self.sessions:
+            login = first_cmd - self.rng.uniform(1, 60)
+            logout = last_cmd + self.rng.uniform(5, 300)
+            line = f"pts/{self.rng.randint(0, 5)}"
+            host = self.rng.choice(hosts)
+            pid = self.rng.randint(1000, 65000)
+            if self.rng.random() < 0.1: # Mistyped password before getting in
+                for i in range(self.rng.randint(1, 3)):
+                    btmp.append((LOGIN_PROCESS, pid, line, self.user, host, login - self.rng.uniform(3, 20) * (i + 1)))
+            wtmp.append((USER_PROCESS, pid, line, self.user, host, login))
+            wtmp.append((DEAD_PROCESS, pid, line, '', '', logout))
+            last = (login, line, host)
+        btmp.sort(key=lambda r: r[5])
+        for path, records in ((self.wtmp, wtmp), (self.btmp, btmp)):
+            if records:
+                entries = [(i * UTMP_STRUCT.size, UTMP_STRUCT.size,
+                            (self.user, 'failed_login' if path == self.btmp else 'login' if ut_type == USER_PROCESS else 'logout',
+                             f"{line} {host}".strip(), timestamp))
+                           for i, (ut_type, _, line, _, host, timestamp) in enumerate(records)] if _record_entries else None
+                self.write_artifact(path, pack_utmp_records(records), entries)
+        if last:
+            if self._recorder is not None:
+                self._recorder.lastlog(*last)
+            try:
+                write_lastlog(self.lastlog, self.uid, *last)
+            except OSError as e:
+                print(f"Warning: Could not write to {self.lastlog} ({e.strerror}, run with sudo?)")
+
+    def add_cron_jobs(self):
+        cron_jobs = []
+        
+        interpreters = [
+            "/usr/bin/python3",
+            "/usr/bin/python2",
+            "/usr/bin/perl",
+            "/usr/bin/bash",
+            "/usr/bin/ruby",
+            "/usr/bin/node",
+            "/bin/bash"
+        ]
+        
+        for _ in range(self.num_cronjobs):
+            minute = self.rng.randint(0, 59)
+            hour = self.rng.randint(0, 23)
+            day_of_month = self.rng.randint(1, 31)
+            month = self.rng.randint(1, 12)
+            day_of_week = self.rng.randint(0, 6)
+
+            random_folder = self.fake.word()
+            random_file_name = self.fake.word()
+            file_extension = self.rng.choice([".py", ".sh", ".bat", ".pl", ".php", ".js"])
+            
+            random_file_path = f"/home/{self.user}/{random_folder}/{random_file_name}{file_extension}"
+            
+            random_interpreter = self.rng.choice(interpreters)
+            
+            cron_job = f"{minute} {hour} {day_of_month} {month} {day_of_week} {self.user} {random_interpreter} {random_file_path}\n"
+            cron_jobs.append(cron_job)
+            self.cron_scripts.append((random_interpreter, random_file_path))
+        
+        # One write per block so concurrent users never interleave inside each other's cron section
+        self.write_artifact(self.crontab, *self._block("\n# Added by user activity simulator\n", cron_jobs, 'cron'))
+
+    def modify_bashrc(self):
+        alias_commands = [
+            "ls -la", "cd ..", "git status", "top", "htop", "cat /etc/passwd",
+            "find / -name 'test*'", "echo 'hello world'", "df -h", "ps aux", "free -m"
+        ]
+        
+        path_additions = [
+            "/home/" + self.user + "/.local/bin",
+            "/usr/local/bin",
+            "/opt/bin"
+        ]
+        
+        ps1_formats = [
+            "PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\033[00m\\]\\$ '",
+            "PS1='\\[\\033[01;31m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;33m\\]\\w\\[\\033[00m\\]\\$ '",
+            "PS1='\\[\\033[01;36m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;35m\\]\\w\\[\\033[00m\\]\\$ '",
+            "PS1='\\[\\033[01;34m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;37m\\]\\w\\[\\033[00m\\]\\$ '"
+        ]
+        
+        random_alias_command = f"alias {self.fake.word()}='{self.rng.choice(alias_commands)}'"
+        random_path = self.rng.choice(path_additions)
+        random_ps1 = self.rng.choice(ps1_formats)
+        
+        additions = [
+            random_alias_command + "\n",
+            f"export PATH=$PATH:{random_path}\n",
+            random_ps1 + "\n"
+        ]
+        
+        self.write_artifact(self.bashrc, *self._block("\n# Custom aliases added by simulation\n", additions, 'bashrc'))
+        print(f"[*] Customizations added to {self.bashrc}")
+
+    def create_temp_files(self):
+        for _ in range(self.rng.randint(3, 25)):
+            filename = os.path.join(self.tmp_dir, self.fake.file_name())
+            content = self.fake.text(max_nb_chars=200)
+            try:
+                if self.timeline is not None:
+                    mtime = self.clock.random_time()
+                    atime = self.rng.uniform(mtime, self.timeline.end) # Read back some time later
+                    self.create_artifact_file(filename, content, atime, mtime)
+                else:
+                    self.create_artifact_file(filename, content)
+            except Exception as e:
+                print(f"Error creating temp file: {e}")
+
+    def synthesize_home(self, files, scripts):
+        # Separate RNG stream for the file tree, so a cache replay can regenerate it exactly from the seed
+        rng = random.Random(derive_seed(self.seed, self.user, 'files')) if self.seed is not None else self.rng
+        self.synthesizer = FilesystemSynthesizer(
+            self.home_dir, self.profile, rng, uid=self.uid, gid=self.gid,
+            mtime=(lambda rng: self.clock.random_time(rng)) if self.timeline is not None else None,
+            end=self.timeline.end if self.timeline is not None else None, target=self.target_path)
+        self.synthesizer.synthesize(files)
+        self.synthesizer.cron_scripts(scripts)
+        if self._recorder is not None:
+            self._recorder.synthesize(files, scripts)
+
+    def simulate(self):
+        print(f"[*] Simulating {self.num_commands} commands for {self.profile.value} user {self.user}...")
+        if self.journal is not None:
+            self.journal.begin([self.user], (self.bash_history, self.bashrc))
+        
+        key = self.cache_key()
+        cached = self.cache.lookup(key) if key else None
+        if cached:
+            with instrumentation.timer('simulate.cache_replay'):
+                self.replay_artifacts(*cached)
+            print(f"[*] Replayed cached artifacts for {self.user} ({key[:12]})")
+        else:
+            self._recorder = self.cache.recorder(key) if key else None
+            try:
+                self.generate_artifacts()
+            except BaseException:
+                if self._recorder is not None:
+                    self._recorder.abort()
+                raise
+            finally:
+                recorder, self._recorder = self._recorder, None
+            if recorder is not None:
+                with instrumentation.timer('simulate.cache_store'):
+                    self.cache.commit(recorder, {'commands': self.commands_emitted, 'sessions': self.sessions})
+        with instrumentation.timer('simulate.flush'):
+            self.flush_artifacts()
+        if self.journal is not None:
+            self.journal.commit([self.user], {path: c.drain() for path, c in self._staged.items()},
+                                (self.bash_history, self.bashrc))
+        self.release_artifacts()
+        
+        print("[*] Simulation complete. Artifacts generated:")
+        self.print_summary()
+
+    def generate_artifacts(self):
+        # Streaming pipeline: generate -> timestamp -> execute -> sink. Every stage is a lazy generator pulled one
+        # command at a time, so memory stays flat for any num_commands and history reaches disk as the run goes.
+        total = max(0, self.num_commands - self.num_sudo) + self.num_sudo
+        commands = self.command_stream(self.num_commands - self.num_sudo, self.num_sudo)
+        stamped = zip(self.clock.timestamps(total), commands)
+        executed = ((ts, cmd) for ts, cmd in stamped if self.run_command(cmd, ts))
+        with instrumentation.timer('simulate.commands'):
+            for ts, cmd in executed:
+                self.add_to_bash_history(cmd, ts)
+                self.track_session(ts)
+                if self.journal is not None and self.commands_emitted % self.journal.interval == 0:
+                    self.checkpoint()
+        instrumentation.count('commands', self.commands_emitted)
+        
+        with instrumentation.timer('simulate.login_records'):
+            self.add_login_records()
+        with instrumentation.timer('simulate.cron_jobs'):
+            self.add_cron_jobs()
+        with instrumentation.timer('simulate.bashrc'):
+            self.modify_bashrc()
+        with instrumentation.timer('simulate.temp_files'):
+            self.create_temp_files()
+        if self.home_files:
+            with instrumentation.timer('simulate.home_files'):
+                self.synthesize_home(self.home_files, self.cron_scripts)
+        if self.executor is not None:
+            with instrumentation.timer('simulate.executor_wait'):
+                self.executor.wait()
+
+    def checkpoint(self):
+        if _stop_requested.is_set():
+            raise SimulationInterrupted(self.user)
+        self.journal.progress(self.user, self.commands_emitted, (self.bash_history,))
+
+    def print_summary(self):
+        print(f"     - {self.commands_emitted} commands added to {self.bash_history}")
+        print(f"     - {self.num_sudo} sudo commands logged to {self.auth_log}")
+        print(f"     - {len(self.sessions)} login sessions recorded in {self.wtmp} and {self.lastlog}")
+        print(f"     - {self.num_cronjobs} cron jobs added to {self.crontab}")
+        print(f"     - Customizations added to {self.bashrc}")
+        print(f"     - Temporary files written to {self.tmp_dir}")
+        if self.synthesizer is not None:
+            s = self.synthesizer
+            print(f"     - {s.files} files synthesised under {self.home_dir} "
+                  f"({s.bytes_written / 2**20:.1f} MB written, {s.logical_bytes / 2**30:.2f} GB apparent)")
+
+def simulate_concurrent_users(users_config, stagger=(0.1, 1.5), journal=None, merge=True):
+    # merge=False leaves the shared logs in per-user blocks, for callers that merge a larger run at its end
+    starts = shared_artifact_sizes({config.get('root') for config in users_config}) if merge else None
+    value_pool = shared_value_pool() # One pre-sampled Faker value pool for every thread, instead of a Faker() per simulator
+    prepare_accounts(users_config) # UIDs follow the config order, not the order the threads happen to start in
+    threads = [] # empty list threads is created to store all the threads that will be created in the function. This allows us to manage and wait for them to complete later.
+    
+    for config in users_config: # The function expects an argument users_config, which is presumably a list of configurations for different users.
+        t = threading.Thread(target=run_single_simulation, args=(config, value_pool, None, journal))
+        threads.append(t)
+        t.start() # starts the thread, meaning the simulation for the user begins executing concurrently in a separate thread.
+        if stagger: # stagger=None starts everyone at once (benchmarks)
+            time.sleep(random.uniform(*stagger))
+        '''
+        After starting each thread, the function sleeps for a random duration between 0.1 and 1.5 seconds using random.uniform(0.1, 1.5). This simulates a delay 
+        between starting each user's simulation, making the user actions less predictable and simulating real-world scenarios where users may not all start at 
+        the exact same time.
+        To ensure the threads don’t start simultaneously, a random sleep time between 0.1 and 1.5 seconds is added after each thread is started. This simulates 
+        users starting at different times.
+        '''
+    
+    try:
+        for t in threads:
+            t.join() # blocking call that makes the main program wait for the thread t to complete before continuing.
+            # Finally, the t.join() method is called on each thread, ensuring the main program waits for all threads to finish before it proceeds.
+    except KeyboardInterrupt:
+        _stop_requested.set() # Journaled users stop at their next checkpoint; the rest run to completion
+        for t in threads:
+            t.join()
+        raise
+    finally:
+        close_artifact_writers() # All threads are done with the shared auth.log/crontab handles
+    if starts:
+        merge_shared_artifacts(starts)
+
+def _init_pool_worker(record_entries=False, instrument=False):
+    # Runs once in each worker process: start from a clean writer registry and collect instead of writing.
+    # Settings come in as arguments: spawn/forkserver workers don't inherit the parent's globals.
+    global _collect_artifacts, _artifact_writers, _shared_value_pool, _shared_executor, _manifest, _record_entries
+    _collect_artifacts = True
+    _manifest = None # The parent owns the manifest; workers only hand back entries with their artifacts
+    _record_entries = record_entries
+    _artifact_writers = {}
+    _shared_value_pool = None # A forked copy would carry the parent's refill bookkeeping but not its threads
+    _shared_executor = None
+    instrumentation.enabled = instrument
+    instrumentation.reset() # Only this worker's own numbers go back to the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is handled by the parent, which finishes the running chunks
+
+def _simulate_user_chunk(chunk):
+    started = time.perf_counter()
+    for config in chunk:
+        run_single_simulation(config)
+    artifacts = {path: writer.drain() for path, writer in _artifact_writers.items()}
+    _artifact_writers.clear() # Drained; users of the next chunk start new collectors
+    stats = instrumentation.snapshot() if instrumentation.enabled else None
+    instrumentation.reset()
+    return os.getpid(), time.perf_counter() - started, [config.get('user') for config in chunk], artifacts, stats
+
+def simulate_users_pool(users_config, workers=None, chunksize=None, journal=None, merge=True):
+    # Scalable multi-user mode: users are spread over a bounded process pool in chunks, and every worker returns
+    # its artifacts to this process, which is the only one writing the shared files.
+    # Staggered starts are kept as per-user time offsets instead of real sleeps.
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, math.ceil(len(users_config) / (workers * 4)))
+    offset = 0.0
+    configs = []
+    for config in users_config:
+        offset += random.uniform(0.1, 1.5)
+        configs.append(dict(config, start_offset=config.get('start_offset', offset)))
+    chunks = [configs[i:i + chunksize] for i in range(0, len(configs), chunksize)]
+    prepare_accounts(configs) # UIDs follow the config order, not the order the chunks finish in
+
+    busy = {} # worker pid -> seconds spent simulating
+    done = 0
+    # Only the shared files keep a writer between chunks; each user's own files are released once written
+    starts = shared_artifact_sizes({c.get('root') for c in configs})
+    shared = set(starts)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker, initargs=(_record_entries, instrumentation.enabled)) as executor:
+        futures = [executor.submit(_simulate_user_chunk, chunk) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                pid, seconds, users, artifacts, worker_stats = future.result()
+                if worker_stats:
+                    instrumentation.merge(worker_stats)
+                busy[pid] = busy.get(pid, 0.0) + seconds
+                done += len(users)
+                if journal is not None:
+                    # Each chunk's output is journaled as one unit: sizes before, then sizes after it is written
+                    journal.begin(users, artifacts)
+                    journal.commit(users, artifacts)
+                else:
+                    for path, (data, entries) in artifacts.items():
+                        if data:
+                            get_artifact_writer(path).write(data, entries)
+                for path in artifacts:
+                    if path not in shared:
+                        release_artifact_writer(path)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True) # Chunks already running are left to finish
+            raise
+        finally:
+            close_artifact_writers()
+    if merge:
+        merge_shared_artifacts(starts) # Chunks finish in any order; this process is the only writer, so it sorts
+    elapsed = time.perf_counter() - started
+
+    stats = {
+        'users': done,
+        'workers': workers,
+        'elapsed': elapsed,
+        'users_per_second': done / elapsed if elapsed else 0.0,
+        'worker_busy': busy
+    }
+    print(f"[*] Simulated {done} users in {elapsed:.2f}s ({stats['users_per_second']:.1f} users/s) on {workers} workers")
+    for pid, seconds in sorted(busy.items()):
+        print(f"     - worker {pid}: busy {seconds:.2f}s ({100 * seconds / elapsed if elapsed else 0:.0f}%)")
+    return stats
+
+def diurnal_factor(model, timestamp):
+    # Share of the peak command rate at a wall-clock time: a smooth hump over working hours on workdays
+    # (1.0 mid-day), off_hours_activity at night and weekend_activity at weekends
+    moment = datetime.fromtimestamp(timestamp)
+    hour = moment.hour + moment.minute / 60
+    low = model.off_hours_activity if moment.weekday() in model.workdays else model.weekend_activity
+    if moment.weekday() not in model.workdays or not model.work_start <= hour < model.work_end:
+        return max(low, 0.01)
+    return low + (1 - low) * math.sin(math.pi * (hour - model.work_start) / (model.work_end - model.work_start))
+
+class RealtimeTraffic:
+    # Long-running live mode: every user emits commands at `rate` per minute (with jitter, optionally following
+    # a diurnal curve) on one asyncio event loop. A single heap of due times drives all users, so thousands of
+    # users cost a heap entry each instead of a thread; real commands go to a small bounded subprocess pool.
+    # Each next due time is computed from the previous due time, not from when the command actually ran,
+    # so dispatch delays don't accumulate into a lower rate.
+    def __init__(self, users_config, rate=2.0, jitter=0.3, diurnal=None, max_procs=8, timeout=5.0,
+                 duration=None, report_interval=5.0, stats_file=None):
+        self.rate = rate # Commands per minute per user (a user's "rate" key overrides it)
+        self.jitter = jitter
+        self.diurnal = diurnal # ActivityModel, or None for a flat rate
+        self.max_procs = max_procs
+        self.max_pending = max_procs * 4 # Commands queued beyond this are dropped instead of piling up
+        self.timeout = timeout
+        self.duration = duration
+        self.report_interval = report_interval
+        self.stats_file = stats_file
+        value_pool = shared_value_pool()
+        self.starts = shared_artifact_sizes({config.get('root') for config in users_config})
+        self.users = []
+        for config in users_config:
+            # Live timestamps and our own subprocess pool instead of the simulator's thread executor
+            simulator = build_simulator(dict(config, execute=False, history_days=None), value_pool)
+            commands = self._commands(simulator)
+            execute = config.get('execute', True) and simulator.root is None # --root never runs anything
+            self.users.append((simulator, commands, config.get('rate', rate), execute))
+        self.counters = {'dispatched': 0, 'sudo': 0, 'executed': 0, 'timed_out': 0, 'failed': 0, 'skipped': 0, 'dropped': 0}
+        self.lag = deque(maxlen=10000) # Seconds between a command's due time and its dispatch, most recent first out
+        self._window = deque() # Dispatch times within the last report interval
+        self._tasks = set() # Running subprocess tasks (the loop itself only keeps weak references to them)
+        self._started = None
+        # Every user keeps its history file open: make sure thousands of them fit under the descriptor limit
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = len(self.users) + 1024
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY else min(wanted, hard), hard))
+
+    @staticmethod
+    def _commands(simulator):
+        # Endless stream keeping the configured plain/sudo mix, one block of num_commands at a time
+        plain, sudo = max(0, simulator.num_commands - simulator.num_sudo), simulator.num_sudo
+        if not plain + sudo:
+            plain = 1
+        while True:
+            yield from simulator.command_stream(plain, sudo)
+
+    def _interval(self, rate, rng, now):
+        factor = diurnal_factor(self.diurnal, now) if self.diurnal else 1.0
+        return 60.0 / (rate * factor) * (1 + rng.uniform(-self.jitter, self.jitter))
+
+    def target_rate(self):
+        # Commands per second the schedule is aiming for right now, over all users
+        factor = diurnal_factor(self.diurnal, time.time()) if self.diurnal else 1.0
+        return sum(rate for _, _, rate, _ in self.users) * factor / 60
+
+    def snapshot(self):
+        lag = sorted(self.lag)
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        window = min(self.report_interval, elapsed) or 1.0
+        rate = len(self._window) / window
+        target = self.target_rate()
+        return dict(self.counters, users=len(self.users), elapsed=round(elapsed, 3), running=len(self._tasks),
+                    rate=round(rate, 3), target_rate=round(target, 3),
+                    rate_accuracy=round(rate / target, 4) if target else None,
+                    lag_p50_ms=round(lag[len(lag) // 2] * 1000, 3) if lag else 0.0,
+                    lag_p99_ms=round(lag[int(len(lag) * 0.99)] * 1000, 3) if lag else 0.0)
+
+    def _dispatch(self, index):
+        simulator, commands, _, execute = self.users[index]
+        now = time.time()
+        command = next(commands)
+        simulator.add_to_bash_history(command, now)
+        simulator.track_session(now)
+        simulator.commands_emitted += 1
+        self.counters['dispatched'] += 1
+        if command.startswith('sudo'):
+            simulator.log_sudo_command(command, now)
+            self.counters['sudo'] += 1
+        elif not execute or is_never_terminating(command):
+            self.counters['skipped'] += 1
+        elif len(self._tasks) >= self.max_pending:
+            self.counters['dropped'] += 1
+        else:
+            task = self._loop.create_task(self._execute(command))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, command):
+        import asyncio
+        async with self._procs:
+            instrumentation.count('subprocess.spawned')
+            try:
+                proc = await asyncio.create_subprocess_shell(
+                    command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL, start_new_session=True)
+            except OSError:
+                self.counters['failed'] += 1
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), self.timeout)
+                self.counters['executed'] += 1
+            except asyncio.TimeoutError:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL) # Same process-group kill as CommandExecutor
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                self.counters['timed_out'] += 1
+
+    def _write_stats(self, stats):
+        with open(self.stats_file + '.tmp', 'w') as f:
+            json.dump(stats, f)
+        os.replace(self.stats_file + '.tmp', self.stats_file) # Readers never see a half-written file
+
+    async def _report(self, stop):
+        import asyncio
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.report_interval)
+                break # The final snapshot is taken by run() once the last commands are done
+            except asyncio.TimeoutError:
+                pass
+            flush_artifact_writers() # Live consumers (log shippers, tail -f) see output within one interval
+            stats = self.snapshot()
+            print(f"[*] {stats['elapsed']:.0f}s: {stats['dispatched']} commands, {stats['rate']:.2f}/s "
+                  f"(target {stats['target_rate']:.2f}/s), lag p50 {stats['lag_p50_ms']:.1f} ms "
+                  f"p99 {stats['lag_p99_ms']:.1f} ms, {stats['running']} running, {stats['dropped']} dropped")
+            if self.stats_file:
+                self._write_stats(stats)
+
+    async def run(self):
+        import asyncio # Only real-time runs pay for importing asyncio
+        loop = self._loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        if self.duration:
+            loop.call_later(self.duration, stop.set)
+        self._procs = asyncio.Semaphore(self.max_procs)
+        self._started = time.monotonic()
+        now = loop.time()
+        # First commands spread over one interval, so users don't all fire together at start-up
+        heap = [(now + self._interval(rate, sim.rng, time.time()) * sim.rng.random(), i)
+                for i, (sim, _, rate, _) in enumerate(self.users)]
+        heapq.heapify(heap)
+        reporter = loop.create_task(self._report(stop))
+        print(f"[*] Real-time traffic: {len(self.users)} users at {self.rate:g} commands/min"
+              + (" (diurnal)" if self.diurnal else "") + ", Ctrl-C to stop")
+        try:
+            while heap and not stop.is_set():
+                due, index = heap[0]
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(min(delay, 0.5)) # Wake up regularly so a stop request is seen promptly
+                    continue
+                heapq.heapreplace(heap, (due + self._interval(self.users[index][2], self.users[index][0].rng, time.time()), index))
+                self.lag.append(-delay)
+                self._window.append(loop.time())
+                while self._window[0] < loop.time() - self.report_interval:
+                    self._window.popleft()
+                self._dispatch(index)
+        finally:
+            stop.set()
+            await reporter
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            if self._tasks:
+                await asyncio.gather(*self._tasks) # Each is bounded by the command timeout
+            for simulator, _, _, _ in self.users:
+                simulator.add_login_records()
+                simulator.flush_artifacts()
+            close_artifact_writers()
+            merge_shared_artifacts(self.starts) # Login records go out per user at the end
+        stats = self.snapshot()
+        if self.stats_file:
+            self._write_stats(stats) # Covers the last, partial interval too
+        return stats
+
+def run_realtime(users_config, **options):
+    import asyncio
+    stats = asyncio.run(RealtimeTraffic(users_config, **options).run())
+    print(f"[*] Stopped after {stats['elapsed']:.0f}s: {stats['dispatched']} commands ({stats['sudo']} sudo), "
+          f"{stats['executed']} executed, {stats['timed_out']} timed out, {stats['dropped']} dropped")
+    return stats
+
+def parse_history_end(value):
+    # Timeline end as epoch seconds or an ISO date/time ("2024-05-31", "2024-05-31T18:00"), or a date/datetime
+    # (what YAML makes of an unquoted 2024-05-31). Dates without a time mean local midnight.
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    if value.replace('.', '', 1).isdigit():
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+def build_simulator(config, value_pool=None, seed=None, journal=None):
+    seed = config.get('seed', seed)
+    history_days = config.get('history_days')
+    cache = config.get('cache')
+    if cache:
+        cache = ArtifactCache.open(cache, config.get('cache_size', 1 << 30))
+    return LinuxUserSimulator(
+        num_commands=config.get('num_commands', 50),
+        num_sudo=config.get('num_sudo', 10),
+        num_cronjobs=config.get('num_cronjobs', 3),
+        user=config.get('user'),
+        profile=config.get('profile', UserProfile.GENERAL),
+        value_pool=value_pool if seed is None else None, # Seeded users draw from their own pool
+        start_offset=config.get('start_offset', 0.0),
+        execute=config.get('execute', True),
+        timeline=Timeline(days=history_days, end=parse_history_end(config.get('history_end'))) if history_days else None,
+        root=config.get('root'),
+        session_model=config.get('session_model'),
+        seed=seed,
+        cache=cache or None,
+        home_files=config.get('home_files', 0),
+        journal=journal
+    )
+
+def run_single_simulation(config, value_pool=None, seed=None, journal=None):
+    try:
+        build_simulator(config, value_pool, seed, journal).simulate()
+    except SimulationInterrupted:
+        print(f"[!] Stopped {config.get('user')} before it finished, it will be redone on --resume")
+    except Exception as e:
+        print(f"Error simulating user {config.get('user')}: {e}")
+
+def display_centered_ascii_art():
+    ascii_art = r"""
+ _________  ___  ___     ___    ___ _________  ________  ________  ________  _______      
+|\___   ___\\  \|\  \   |\  \  /  /|\___   ___\\   __  \|\   __  \|\   ____\|\  ___ \     
+\|___ \  \_\ \  \\\  \  \ \  \/  / ||___ \  \_\ \  \|\  \ \  \|\  \ \  \___|\ \   __/|    
+     \ \  \ \ \  \\\  \  \ \    / /     \ \  \ \ \   _  _\ \   __  \ \  \    \ \  \_|/__  
+      \ \  \ \ \  \\\  \  /     \/       \ \  \ \ \  \\  \\ \  \ \  \ \  \____\ \  \_|\ \ 
+       \ \__\ \ \_______\/  /\   \        \ \__\ \ \__\\ _\\ \__\ \__\ \_______\ \_______\
+        \|__|  \|_______/__/ /\ __\        \|__|  \|__|\|__|\|__|\|__|\|_______|\|_______|
+                        |__|/ \|__|                                                       
+    """
+    terminal_width = shutil.get_terminal_size().columns
+    centered_art = [line.center(terminal_width) for line in ascii_art.split('\n')]
+    print('\n'.join(centered_art))
+
+SCENARIO_USER_KEYS = {
+    'user': str, 'profile': str, 'num_commands': int, 'num_sudo': int, 'num_cronjobs': int,
+    'execute': bool, 'history_days': int, 'history_end': (int, float, str, date), 'session_model': (bool, str),
+    'seed': int, 'count': int, 'home_files': int, 'rate': (int, float)
+}
+SCENARIO_KEYS = {
+    'defaults': (dict, type(None)), 'users': list, 'root': str, 'engine': str, 'workers': int, 'shard_size': int,
+    'stagger': (list, type(None)), 'cache': str, 'cache_size': int
+}
+ENGINES = ('threads', 'processes')
+
+def load_scenario(path):
+    # Scenario files are JSON, or YAML when the extension says so (PyYAML is only imported then)
+    with open(path) as f:
+        if path.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML scenarios need PyYAML (pip install pyyaml), or use a .json scenario")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def expand_scenario(scenario):
+    # Validates the whole scenario up front and expands it into one config per simulated user.
+    # An entry with "count": N and a "{n}" in its user name stands for N users (dev{n} -> dev1..devN).
+    errors = []
+    if not isinstance(scenario, dict):
+        raise ValueError("scenario must be a mapping with a 'users' list")
+    for key, value in scenario.items():
+        expected = SCENARIO_KEYS.get(key)
+        if expected is None:
+            errors.append(f"unknown top-level key '{key}'")
+        elif key == 'users':
+            continue # Checked below
+        elif not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            errors.append(f"'{key}' has the wrong type ({value!r})")
+        elif key in ('workers', 'shard_size', 'cache_size') and value < 1:
+            errors.append(f"'{key}' must be positive")
+        elif key == 'engine' and value not in ENGINES:
+            errors.append(f"unknown engine '{value}' (expected one of {', '.join(ENGINES)})")
+        elif key == 'stagger' and value is not None and not (
+                len(value) == 2 and all(isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0 for v in value)
+                and value[0] <= value[1]):
+            errors.append(f"'stagger' must be a [min, max] pair of seconds ({value!r})")
+    defaults = scenario.get('defaults') if isinstance(scenario.get('defaults'), dict) else {} # null: no defaults
+    entries = scenario.get('users')
+    if not isinstance(entries, list) or not entries:
+        errors.append("'users' must be a non-empty list")
+        entries = []
+    profiles = {p.value for p in UserProfile}
+    users_config = []
+    seen = set()
+    for i, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            errors.append(f"users[{i}]: expected a mapping")
+            continue
+        config = dict(defaults, **entry)
+        for key, value in config.items():
+            expected = SCENARIO_USER_KEYS.get(key)
+            if expected is None:
+                errors.append(f"users[{i}]: unknown key '{key}'")
+            elif not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                errors.append(f"users[{i}]: '{key}' has the wrong type ({value!r})")
+            elif expected is int and value < 0:
+                errors.append(f"users[{i}]: '{key}' must not be negative")
+        if isinstance(config.get('rate'), (int, float)) and config['rate'] <= 0:
+            errors.append(f"users[{i}]: 'rate' must be positive")
+        if config.get('profile', 'general') not in profiles:
+            errors.append(f"users[{i}]: unknown profile '{config.get('profile')}'")
+        if isinstance(config.get('history_end'), str):
+            try:
+                parse_history_end(config['history_end'])
+            except ValueError:
+                errors.append(f"users[{i}]: 'history_end' is not an ISO date ({config['history_end']!r})")
+        elif isinstance(config.get('history_end'), date):
+            config['history_end'] = parse_history_end(config['history_end']) # Epoch seconds from here on (JSON-safe)
+        count = config.pop('count', 1)
+        name = config.get('user')
+        if not isinstance(count, int) or isinstance(count, bool):
+            continue # Already reported as the wrong type
+        if count < 1:
+            errors.append(f"users[{i}]: 'count' must be at least 1")
+            continue
+        if count > 1 and (not isinstance(name, str) or '{n}' not in name):
+            errors.append(f"users[{i}]: 'count' needs a user name containing '{{n}}'")
+            continue
+        for n in range(1, count + 1):
+            expanded = dict(config, user=name.replace('{n}', str(n)) if isinstance(name, str) else name)
+            if expanded['user'] in seen:
+                errors.append(f"users[{i}]: duplicate user '{expanded['user']}'")
+                break
+            seen.add(expanded['user'])
+            users_config.append(expanded)
+    if errors:
+        raise ValueError('; '.join(errors[:20]) + (f" (+{len(errors) - 20} more)" if len(errors) > 20 else ''))
+    return users_config
+
+def shard_users(users_config, shard_size):
+    return [users_config[i:i + shard_size] for i in range(0, len(users_config), shard_size)]
+
+def run_batch(args):
+    # Non-interactive entry point: everything comes from flags and/or a scenario file, no banner, no prompts
+    scenario = {}
+    if args.scenario:
+        scenario = load_scenario(args.scenario)
+    else:
+        user = args.user or os.getenv('SUDO_USER', os.getenv('USER')) # Same default as the interactive mode
+        if not user:
+            print("[!] --user is required when neither SUDO_USER nor USER is set")
+            return 2
+        scenario = {'users': [{'user': user, 'profile': args.profile, 'num_commands': args.commands,
+                               'num_sudo': args.sudo, 'num_cronjobs': args.cronjobs}]}
+    if isinstance(scenario, dict):
+        if scenario.get('defaults') is None:
+            scenario['defaults'] = {}
+        defaults = scenario['defaults'] if isinstance(scenario['defaults'], dict) else {} # Reported by expand_scenario
+        if args.dry_run:
+            defaults['execute'] = False
+        if args.history_days:
+            defaults['history_days'] = args.history_days
+        if args.session_model:
+            defaults['session_model'] = True if args.session_model == 'default' else args.session_model
+        if args.seed is not None:
+            defaults['seed'] = args.seed
+        if args.history_end:
+            defaults['history_end'] = args.history_end
+        if args.home_files:
+            defaults['home_files'] = args.home_files
+        for key in ('engine', 'workers', 'shard_size'): # Flags override the scenario and are validated with it
+            if getattr(args, key) is not None:
+                scenario[key] = getattr(args, key)
+    try:
+        users_config = expand_scenario(scenario)
+    except ValueError as e:
+        print(f"[!] Invalid scenario: {e}")
+        return 2
+
+    root = args.root or scenario.get('root')
+    cache = args.cache or scenario.get('cache')
+    cache_size = int(args.cache_size * 1024 * 1024) if args.cache_size else scenario.get('cache_size', 1 << 30)
+    users_config = [dict(c, root=root, cache=cache, cache_size=cache_size) for c in users_config]
+    manifest = open_manifest(args.manifest, fresh=not args.resume) if args.manifest else None
+    try:
+        return _run_users(args, scenario, users_config, root, manifest)
+    finally:
+        if manifest is not None:
+            close_manifest()
+            print(f"[*] Artifact manifest written to {args.manifest}")
+
+def _run_users(args, scenario, users_config, root, manifest):
+    engine = scenario.get('engine', 'threads')
+    workers = scenario.get('workers')
+    stagger = scenario.get('stagger') # Batch runs start everyone at once unless the scenario asks for staggering
+
+    if args.realtime:
+        if args.rate <= 0:
+            print("[!] --rate must be positive")
+            return 2
+        run_realtime(users_config, rate=args.rate, jitter=args.jitter, diurnal=ActivityModel() if args.diurnal else None,
+                     max_procs=args.procs, duration=args.duration, stats_file=args.stats_file)
+        return 0
+
+    journal = None
+    if args.checkpoint:
+        journal = CheckpointJournal(args.checkpoint).open(users_config, shared_artifact_paths(root), resume=args.resume)
+        if manifest is not None and journal.truncated:
+            manifest.discard_after(journal.truncated)
+        if journal.done:
+            print(f"[*] Resuming from {args.checkpoint}: {len(journal.done)} of {len(users_config)} users already done")
+            users_config = [c for c in users_config if c.get('user') not in journal.done]
+    elif args.resume:
+        print("[!] --resume needs the --checkpoint FILE of the interrupted run")
+        return 2
+
+    starts = journal.started if journal is not None else shared_artifact_sizes({c.get('root') for c in users_config})
+    shards = shard_users(users_config, scenario.get('shard_size', 500))
+    print(f"[*] {len(users_config)} users in {len(shards)} shard(s), engine={engine}" + (f", root={root}" if root else ""))
+
+    try:
+        for i, shard in enumerate(shards, 1):
+            print(f"[*] Shard {i}/{len(shards)}: {len(shard)} users")
+            if len(shard) == 1 and engine != 'processes':
+                try:
+                    run_single_simulation(shard[0], journal=journal)
+                finally:
+                    close_artifact_writers()
+            elif engine == 'processes':
+                simulate_users_pool(shard, workers=workers, journal=journal, merge=False)
+            else:
+                simulate_concurrent_users(shard, stagger=tuple(stagger) if stagger else None, journal=journal,
+                                          merge=False)
+            if _stop_requested.is_set():
+                raise KeyboardInterrupt
+        merge_shared_artifacts(starts) # Once over every shard (and, on --resume, over the output of earlier attempts)
+    finally:
+        if journal is not None:
+            journal.close()
+    return 0
+
+def query_manifest(args):
+    # Prints the manifest rows matching --user/--kind/--since/--until, one per line
+    if not os.path.exists(args.manifest):
+        print(f"[!] No manifest at {args.manifest}")
+        return 1
+    manifest = ArtifactManifest(args.manifest)
+    try:
+        rows = manifest.query(user=args.user, kind=args.kind,
+                              start=parse_history_end(args.since), end=parse_history_end(args.until))
+    finally:
+        manifest.close()
+    for user, kind, command, timestamp, path, offset, length, line in rows:
+        when = datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp is not None else '-'
+        where = f"{path}:{line}" if line is not None else f"{path}@{offset}"
+        print(f"{when}\t{user}\t{kind}\t{where}\t{command}")
+    print(f"[*] {len(rows)} matching entries")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Linux user activity and generate forensic artifacts. "
+                                                 "Without --batch/--scenario the interactive prompts are used.")
+    parser.add_argument('--root', metavar='DIR',
+                        help="render a synthetic filesystem under DIR instead of touching the live system "
+                             "(no useradd, no command execution, no root needed)")
+    batch = parser.add_argument_group('batch mode')
+    batch.add_argument('--batch', action='store_true', help="run non-interactively from the flags below")
+    batch.add_argument('--scenario', metavar='FILE', help="JSON/YAML scenario listing users, profiles and counts (implies --batch)")
+    batch.add_argument('--user', help="user to simulate (single-user batch run)")
+    batch.add_argument('--profile', default='general', choices=[p.value for p in UserProfile])
+    batch.add_argument('--commands', type=int, default=50, help="number of commands (default 50)")
+    batch.add_argument('--sudo', type=int, default=10, help="number of sudo commands (default 10)")
+    batch.add_argument('--cronjobs', type=int, default=3, help="number of cron jobs (default 3)")
+    batch.add_argument('--dry-run', action='store_true', help="artifact-only: record commands without running them")
+    batch.add_argument('--history-days', type=int, default=0, help="backdate activity over N days")
+    batch.add_argument('--history-end', metavar='DATE', help="end of the backdated window (ISO date, default now)")
+    batch.add_argument('--seed', type=int, help="make the run reproducible (independent per-user random streams)")
+    batch.add_argument('--cache', metavar='DIR', help="replay seeded runs from an artifact cache in DIR "
+                                                     "(needs --seed, --history-days/--history-end and --dry-run or --root)")
+    batch.add_argument('--cache-size', type=float, metavar='MB', help="evict least-recently-used cache entries above this size")
+    batch.add_argument('--home-files', type=int, default=0, metavar='N',
+                       help="synthesise N profile-specific files (and the cron jobs' scripts) in each home directory")
+    batch.add_argument('--session-model', metavar='PATH', help="Markov session model file, or 'default' for the built-in one")
+    batch.add_argument('--checkpoint', metavar='FILE', help="journal per-user progress to FILE so an interrupted run can be resumed")
+    batch.add_argument('--resume', action='store_true', help="continue the run journaled in --checkpoint, skipping finished users")
+    batch.add_argument('--engine', choices=ENGINES, help="multi-user engine (default threads)")
+    batch.add_argument('--workers', type=int, help="process pool size for --engine processes")
+    batch.add_argument('--shard-size', type=int, help="users per run when splitting large scenarios (default 500)")
+    manifest = parser.add_argument_group('artifact manifest')
+    manifest.add_argument('--manifest', metavar='FILE', help="index every written artifact (offsets, lines, hashes) in a SQLite FILE")
+    manifest.add_argument('--query', action='store_true', help="print entries of --manifest instead of simulating "
+                                                               "(filter with --user, --kind, --since, --until)")
+    manifest.add_argument('--kind', choices=['history', 'sudo', 'cron', 'bashrc', 'login', 'logout', 'failed_login'])
+    manifest.add_argument('--since', metavar='DATE', help="ISO date/time or epoch seconds")
+    manifest.add_argument('--until', metavar='DATE', help="ISO date/time or epoch seconds")
+    realtime = parser.add_argument_group('real-time mode')
+    realtime.add_argument('--realtime', action='store_true', help="keep generating live activity until --duration or Ctrl-C")
+    realtime.add_argument('--rate', type=float, default=2.0, help="commands per minute per user (default 2)")
+    realtime.add_argument('--jitter', type=float, default=0.3, help="random spread of the gaps between commands (default 0.3 = ±30%%)")
+    realtime.add_argument('--diurnal', action='store_true', help="follow a working-hours curve instead of a flat rate")
+    realtime.add_argument('--duration', type=float, metavar='SECONDS', help="stop after this long (default: run until stopped)")
+    realtime.add_argument('--procs', type=int, default=8, help="concurrent command subprocesses (default 8)")
+    realtime.add_argument('--stats-file', metavar='FILE', help="keep live counters as JSON in FILE")
+    profiling = parser.add_argument_group('profiling')
+    profiling.add_argument('--profile-report', nargs='?', const='table', choices=['table', 'json'],
+                           help="print per-phase timings and counters at the end (table or json)")
+    profiling.add_argument('--cprofile', metavar='FILE', help="run under cProfile and dump pstats to FILE")
+    profiling.add_argument('--sample', action='store_true', help="add a sampling profile of the main thread to the report")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if not (args.profile_report or args.cprofile or args.sample):
+        return run(args)
+    instrumentation.enabled = True
+    instrumentation.reset()
+    sampler = SamplingProfiler() if args.sample else None
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    if sampler:
+        sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        return run(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"[*] cProfile stats written to {args.cprofile}")
+        if sampler:
+            sampler.stop()
+        close_artifact_writers() # So the byte counters include the final flush
+        if args.profile_report:
+            print(instrumentation.report(args.profile_report))
+        if sampler:
+            print(sampler.report())
+
+def run(args):
+    if args.query:
+        if not args.manifest:
+            print("[!] --query needs --manifest FILE")
+            sys.exit(2)
+        sys.exit(query_manifest(args))
+    if os.geteuid() != 0 and not args.root:
+        print("[!] Warning: Some features require root privileges. Consider running with sudo.")
+    if args.batch or args.scenario:
+        try:
+            sys.exit(run_batch(args))
+        except (OSError, ValueError) as e:
+            print(f"[!] Error: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            close_artifact_writers()
+            print("\n[!] Interrupted, artifacts flushed." +
+                  (f" Continue with --resume --checkpoint {args.checkpoint}" if args.checkpoint else ""))
+            sys.exit(130)
+
+    import readline # Line editing for the interactive prompts only
+    display_centered_ascii_art()
+    print("[*] This script simulates user activity and generates forensic artifacts.\n")
+    print("--- --- --- ---\n")
+    
+    try:
+        while True:  # Keep asking until we get valid input
+            mode = input("==> Simulation mode (single/multi): ").lower() or "single"
+            
+            if mode == "single":
+                num_commands = int(input("==> Number of commands to simulate (default 50): ") or 50)
+                num_sudo = int(input("==> Number of sudo commands to simulate (default 10): ") or 10)
+                num_cronjobs = int(input("==> Number of cron jobs to add (default 3): ") or 3)
+                username = input(f"==> Username to simulate (default {os.getenv('SUDO_USER', os.getenv('USER'))}): ") or None
+                profile = input("==> User profile (admin/developer/sysadmin/general): ").lower() or "general"
+                artifact_only = input("==> Artifact-only mode, record commands without running them? (y/N): ").lower() == "y"
+                history_days = int(input("==> Backdate activity over N days (default 0 = real time): ") or 0)
+                
+                simulator = LinuxUserSimulator(
+                    num_commands=num_commands,
+                    num_sudo=num_sudo,
+                    num_cronjobs=num_cronjobs,
+                    user=username,
+                    profile=profile,
+                    execute=not artifact_only,
+                    timeline=Timeline(days=history_days) if history_days else None,
+                    root=args.root
+                )
+                
+                if not args.root:
+                    print("\n[*] Note: Some operations require sudo privileges. You may be prompted for your password.")
+                print("\n[*] Starting simulation...\n")
+                simulator.simulate()
+                close_artifact_writers()
+                break  # Exit the loop after successful simulation
+                
+            elif mode == "multi":
+                num_users = int(input("==> Number of users to simulate (default 3): ") or 3)
+                artifact_only = input("==> Artifact-only mode, record commands without running them? (y/N): ").lower() == "y"
+                history_days = int(input("==> Backdate activity over N days (default 0 = real time): ") or 0)
+                users_config = []
+                
+                for i in range(num_users):
+                    print(f"\nConfiguring user #{i+1}:")
+                    username = input(f"==> Username (leave blank for current): ") or None
+                    profile = input("==> Profile (admin/developer/sysadmin/general): ").lower() or "general"
+                    commands = int(input("==> Commands per user (default 30): ") or 30)
+                    sudo = int(input("==> Sudo commands (default 5): ") or 5)
+                    cronjobs = int(input("==> Cron jobs (default 1): ") or 1)
+                    
+                    users_config.append({
+                        'user': username,
+                        'profile': profile,
+                        'num_commands': commands,
+                        'num_sudo': sudo,
+                        'num_cronjobs': cronjobs,
+                        'execute': not artifact_only,
+                        'history_days': history_days,
+                        'root': args.root
+                    })
+                
+                engine = input("==> Engine (threads/processes, default threads): ").lower() or "threads"
+                
+                print("\n[*] Starting concurrent simulation...")
+                if engine == "processes":
+                    simulate_users_pool(users_config)
+                else:
+                    simulate_concurrent_users(users_config)
+                print("\n[*] All user simulations completed")
+                break  # Exit the loop after successful simulation
+                
+            else:
+                print("[!] Invalid mode. Please enter either 'single' or 'multi'.")
+                continue  # Ask again
+            
+    except KeyboardInterrupt:
+        close_artifact_writers() # Don't lose what is still buffered
+        print("\n[!] Simulation cancelled by user.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"[!] Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
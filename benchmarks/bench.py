@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# TuxTrace benchmark suite.
+# Everything runs against a throwaway --root tree with command execution disabled, so it is safe in a sandbox.
+# Results are printed as JSON (ops/s, p50/p99 latency, peak RSS) and compared against a stored baseline.
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import TuxTrace as tt
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class BenchmarkError(Exception):
+    pass
+
+def measure(fn, iterations, ops_per_iteration=1, finish=None, warmup=0, verify=None):
+    # Times each iteration separately; `finish` (e.g. a flush) is included in the total but not in the latencies.
+    # `warmup` untimed calls first, so one-off costs (lazy Faker start-up, first pool fill) don't skew micro benchmarks.
+    # `verify` runs after the timing and raises BenchmarkError if the run didn't produce what it should have;
+    # a writer that failed (EMFILE, ENOSPC, ...) fails the benchmark too, since its drops would look like speed.
+    failures = tt.ArtifactWriter.failures
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    if finish:
+        finish()
+    elapsed = time.perf_counter() - started
+    if tt.ArtifactWriter.failures > failures:
+        raise BenchmarkError(f"{tt.ArtifactWriter.failures - failures} artifact writer(s) failed")
+    if verify:
+        verify()
+    latencies.sort()
+    return {
+        'ops': iterations * ops_per_iteration,
+        'seconds': round(elapsed, 6),
+        'ops_per_sec': round(iterations * ops_per_iteration / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Process high-water mark so far
+    }
+
+def expect_histories(root, users):
+    # Every simulated user must have ended up with a non-empty .bash_history under root
+    def written(user):
+        path = os.path.join(root, 'home', user, '.bash_history')
+        return os.path.exists(path) and os.path.getsize(path) > 0
+    missing = [user for user in users if not written(user)]
+    if missing:
+        raise BenchmarkError(f"{len(missing)} of {len(users)} users have no .bash_history (e.g. {missing[0]})")
+
+def run_suite(root, scale=1.0):
+    def n(count):
+        return max(1, int(count * scale))
+
+    results = {}
+    sim = tt.LinuxUserSimulator(user='bench', root=root, execute=False)
+
+    for profile in tt.UserProfile:
+        sim.profile = profile
+        sim.catalogue = tt.CommandCatalogue.for_profile(profile)
+        results[f'generate_plausible_command[{profile.value}]'] = measure(
+            sim.generate_plausible_command, n(20000), warmup=1000)
+        results[f'generate_plausible_command[{profile.value},sudo]'] = measure(
+            lambda: sim.generate_plausible_command(use_sudo=True), n(20000), warmup=1000)
+
+    results['log_sudo_command'] = measure(
+        lambda: sim.log_sudo_command("sudo systemctl restart nginx", time.time()), n(20000), finish=sim.flush_artifacts)
+    results['add_to_bash_history'] = measure(
+        lambda: sim.add_to_bash_history("ls -la /tmp", time.time()), n(50000), finish=sim.flush_artifacts)
+    sim.num_cronjobs = 5
+    results['add_cron_jobs'] = measure(sim.add_cron_jobs, n(2000), ops_per_iteration=5, finish=sim.flush_artifacts)
+    results['create_temp_files'] = measure(sim.create_temp_files, n(200))
+    synth = tt.FilesystemSynthesizer(os.path.join(root, 'synth'), tt.UserProfile.DEVELOPER, tt.random.Random(0))
+    results['synthesize_home'] = measure(lambda: synth.synthesize(100), n(20), ops_per_iteration=100, warmup=1)
+
+    single = tt.LinuxUserSimulator(num_commands=200, num_sudo=40, user='bench', root=root, execute=False)
+    results['simulate'] = measure(single.simulate, n(20), ops_per_iteration=200)
+
+    for users in (1, 10, 100, 1000):
+        repeat = 3 if users < 1000 else 1
+        for name, engine in (('simulate_concurrent_users', lambda configs: tt.simulate_concurrent_users(configs, stagger=None)),
+                             ('simulate_users_pool', tt.simulate_users_pool)):
+            # A fresh tree per case, so files left by an earlier case can't hide users this one failed to write
+            case_root = os.path.join(root, f'{name}-{users}')
+            configs = [{'user': f'bench{i}', 'num_commands': 20, 'num_sudo': 4, 'num_cronjobs': 1,
+                        'execute': False, 'root': case_root} for i in range(users)]
+            results[f'{name}[{users}]'] = measure(
+                lambda: engine(configs), repeat, ops_per_iteration=users,
+                verify=lambda: expect_histories(case_root, [c['user'] for c in configs]))
+    tt.close_artifact_writers()
+    return results
+
+def compare(results, baseline, threshold):
+    # A benchmark regresses when its throughput drops more than `threshold` below the baseline
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('ops_per_sec'):
+            continue
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+        result['vs_baseline'] = round(change, 4)
+        if change < -threshold:
+            regressions[name] = round(change, 4)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TuxTrace generation, I/O and multi-user throughput.")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply iteration counts (e.g. 0.1 for a quick run)")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed throughput drop before flagging (default 0.2)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='tuxtrace-bench-') as root:
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                results = run_suite(root, args.scale)
+        except BenchmarkError as e:
+            print(f"[!] Benchmark run is invalid: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    report = {'scale': args.scale, 'results': results, 'regressions': {}}
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'scale': args.scale, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale', 1.0) != args.scale:
+            print(f"[!] Warning: baseline was recorded with --scale {baseline.get('scale', 1.0)}, "
+                  f"this run used {args.scale}; throughput is not directly comparable", file=sys.stderr)
+        report['regressions'] = compare(results, baseline.get('results', {}), args.threshold)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    for name, change in report['regressions'].items():
+        print(f"[!] Regression: {name} is {-change:.0%} slower than baseline", file=sys.stderr)
+    sys.exit(1 if report['regressions'] else 0)
+
+if __name__ == "__main__":
+    main()